@@ -1,10 +1,11 @@
+import logging
 import os
 import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
 from fastapi import HTTPException, status
-from google.cloud.firestore_v1 import Client
+from google.cloud.firestore_v1 import Client, Increment
 
 from models.orders import (
   OrderActionResponse,
@@ -14,8 +15,11 @@ from models.orders import (
   OrderNotesResponse,
   OrderResponse,
 )
+from controllers.product_controller import record_sales
 from lib.firebase_auth import get_user_id
 
+logger = logging.getLogger("bafain.orders")
+
 TAX_RATE = 0.11
 
 
@@ -61,6 +65,37 @@ def _sort_key(value: Any) -> float:
   return 0.0
 
 
+def _record_product_sales(firestore: Client, items: list[Any]) -> None:
+  # sold_count backs the popularity sort; products deleted since the order
+  # was placed are skipped. It is best-effort: the order is already paid,
+  # and sales do not bump the catalog version, so they never contend on it
+  # or invalidate cached catalog responses.
+  quantities: dict[str, int] = {}
+  for item in items:
+    if not isinstance(item, dict) or not item.get("product_id"):
+      continue
+    qty = item.get("qty") if isinstance(item.get("qty"), int) else 1
+    quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + qty
+  if not quantities:
+    return
+  try:
+    products = firestore.collection("products")
+    refs = [
+      doc.reference
+      for doc in firestore.get_all([products.document(product_id) for product_id in quantities])
+      if doc.exists
+    ]
+    if not refs:
+      return
+    batch = firestore.batch()
+    for ref in refs:
+      batch.update(ref, {"sold_count": Increment(quantities[ref.id])})
+    batch.commit()
+    record_sales({ref.id: quantities[ref.id] for ref in refs})
+  except Exception as exc:
+    logger.warning("Could not record product sales: %s", str(exc))
+
+
 def create_order(
   access_token: str, payload: OrderCreateRequest, firestore: Client
 ) -> OrderResponse:
@@ -244,6 +279,7 @@ def check_payment(
         "updated_at": now,
       }
     )
+    _record_product_sales(firestore, data.get("items") or [])
   return {
     "order_id": order_id,
     "status": status_value,
@@ -1,10 +1,46 @@
-from datetime import datetime
+import json
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Iterator
 from uuid import uuid4
 
 from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
 from google.cloud.firestore_v1 import Client
+from pydantic import TypeAdapter, ValidationError
 
-from models.product import ProductCreateRequest, ProductUpdateRequest
+from lib.catalog_cache import LruTtlCache, env_float, env_int
+from lib.catalog_indexes import CatalogIndexes
+from lib.catalog_mirror import catalog_mirror
+from lib.catalog_snapshot import CatalogSnapshot, catalog_snapshots
+from lib.catalog_version import catalog_version
+from lib.firestore_client import get_firestore_client
+from lib.pagination import decode_cursor, encode_cursor
+from lib.product_facets import ProductFacetIndex
+from lib.product_feeds import FEED_FIELDS, product_feeds
+from lib.product_search import ProductSearchIndex
+from lib.product_similarity import feature_matrix, top_k_similar
+from lib.product_sort_index import ProductSortIndex, sort_key_value
+from lib.product_suggest import ProductSuggestIndex
+from lib.static_catalog import (
+  shard_path,
+  static_catalog,
+  static_catalog_auto_publish,
+  static_catalog_dir,
+)
+from models.product import (
+  ProductCreateRequest,
+  ProductImportRow,
+  ProductResponse,
+  ProductUpdateRequest,
+)
+
+
+logger = logging.getLogger("bafain.products")
 
 
 def _doc_to_dict(doc) -> dict:
@@ -13,162 +49,1288 @@ def _doc_to_dict(doc) -> dict:
   return data
 
 
-def _get_subcollection(firestore: Client, product_id: str, name: str) -> list[dict]:
+PRODUCT_CHILD_COLLECTIONS = (
+  "product_images",
+  "product_features",
+  "product_specs",
+  "product_benefits",
+  "product_gallery",
+)
+
+PRODUCT_SORTS = {
+  "newest": ("created_at", "DESCENDING"),
+  "price_asc": ("price_idr", "ASCENDING"),
+  "price_desc": ("price_idr", "DESCENDING"),
+  "popularity": ("sold_count", "DESCENDING"),
+}
+FIRESTORE_SORTS = {"newest", "price_asc", "price_desc"}
+PRODUCT_TOMBSTONES_COLLECTION = "product_tombstones"
+PRODUCT_RELATED_COLLECTION = "product_related"
+# Firestore accepts at most 30 values in an `in` filter.
+CHILD_QUERY_CHUNK_SIZE = 30
+# Firestore commits at most 500 writes per batch.
+MAX_BATCH_WRITES = 500
+# An update transaction also writes the product and the catalog version.
+UPDATE_CHILD_WRITES = MAX_BATCH_WRITES - 2
+BULK_DELETE_MAX_ATTEMPTS = 5
+EXPORT_PAGE_SIZE = 200
+# Rows per import transaction; each product is up to two writes of the 500
+# limit (the product and the removal of an old tombstone for its id).
+IMPORT_CHUNK_SIZE = 200
+REPRICE_CHUNK_SIZE = 400
+STATIC_CATALOG_PAGE_SIZE = env_int("PRODUCT_STATIC_PAGE_SIZE", 50)
+STATIC_CATALOG_SORT = "newest"
+STATIC_SUMMARY_FIELDS = ("title", "price_idr", "price_unit", "image_url", "created_at", "sold_count")
+RELATED_SUMMARY_FIELDS = ("title", "price_idr", "price_unit", "image_url")
+RELATED_PRODUCTS_LIMIT = env_int("PRODUCT_RELATED_LIMIT", 12)
+
+_product_cache = LruTtlCache(
+  "products",
+  max_entries=env_int("PRODUCT_CACHE_MAX_ENTRIES", 1000),
+  ttl_seconds=env_int("PRODUCT_CACHE_TTL_SECONDS", 60),
+)
+_product_list_cache = LruTtlCache(
+  "product_lists",
+  max_entries=env_int("PRODUCT_LIST_CACHE_MAX_ENTRIES", 200),
+  ttl_seconds=env_int("PRODUCT_LIST_CACHE_TTL_SECONDS", 30),
+)
+# Final JSON bodies of GET /products keyed by catalog version, so a write
+# anywhere in the catalog retires every cached page at once.
+_product_list_response_cache = LruTtlCache(
+  "product_list_responses",
+  max_entries=env_int("PRODUCT_LIST_RESPONSE_CACHE_MAX_ENTRIES", 500),
+  ttl_seconds=env_int("PRODUCT_LIST_RESPONSE_CACHE_TTL_SECONDS", 60),
+)
+_product_list_adapter = TypeAdapter(list[ProductResponse])
+_related_cache = LruTtlCache(
+  "product_related",
+  max_entries=env_int("PRODUCT_RELATED_CACHE_MAX_ENTRIES", 1000),
+  ttl_seconds=env_int("PRODUCT_RELATED_CACHE_TTL_SECONDS", 300),
+)
+
+_search_index = ProductSearchIndex(
+  fuzzy_threshold=env_float("PRODUCT_SEARCH_FUZZY_THRESHOLD", 0.3)
+)
+_catalog_indexes = CatalogIndexes(ttl_seconds=env_int("PRODUCT_INDEX_TTL_SECONDS", 300))
+_suggest_index = ProductSuggestIndex()
+_facet_index = ProductFacetIndex()
+_sort_index = ProductSortIndex()
+_catalog_indexes.register(_search_index)
+_catalog_indexes.register(_suggest_index)
+_catalog_indexes.register(_facet_index)
+_catalog_indexes.register(_sort_index)
+catalog_mirror.add_listener(_catalog_indexes)
+
+
+def _on_foreign_catalog_write(_version: int):
+  # Another process (or a script) changed the catalog. Nothing cached here
+  # is keyed by version, so it is dropped before it can be served under the
+  # new ETag; the indexes rebuild on their next use and the feeds in the
+  # background.
+  _product_cache.clear()
+  _product_list_cache.clear()
+  _product_list_response_cache.clear()
+  _related_cache.clear()
+  _catalog_indexes.invalidate()
+  _schedule_feed_refresh()
+
+
+catalog_version.add_listener(_on_foreign_catalog_write)
+
+PRODUCT_DETAIL_TIMEOUT_SECONDS = env_float("PRODUCT_DETAIL_TIMEOUT_SECONDS", 5.0)
+_detail_executor = ThreadPoolExecutor(
+  max_workers=env_int("PRODUCT_DETAIL_MAX_WORKERS", 16),
+  thread_name_prefix="product-detail",
+)
+
+_PAYLOAD_CHILD_FIELDS = {
+  "images": "product_images",
+  "features": "product_features",
+  "specs": "product_specs",
+  "benefits": "product_benefits",
+  "gallery": "product_gallery",
+}
+
+# Scalar product fields selectable with `fields=`; child lists are opted
+# into with `include=` using the payload names above.
+PRODUCT_FIELDS = (
+  "title",
+  "price_idr",
+  "price_unit",
+  "description",
+  "image_url",
+  "created_at",
+  "updated_at",
+  "sold_count",
+)
+# (scalar fields, child collection names)
+Fieldset = tuple[tuple[str, ...], tuple[str, ...]]
+
+
+def _sort_children(items: list[dict]) -> list[dict]:
+  return sorted(items, key=lambda item: item.get("sort_order") or 0)
+
+
+def _get_subcollection(
+  firestore: Client, product_id: str, name: str, timeout: float | None = None
+) -> list[dict]:
   docs = (
     firestore.collection("products")
     .document(product_id)
     .collection(name)
     .order_by("sort_order")
-    .stream()
+    .stream(timeout=timeout)
   )
   return [_doc_to_dict(doc) for doc in docs]
 
 
+def _child_content(item: dict) -> str:
+  return json.dumps(
+    {key: value for key, value in item.items() if key != "id"},
+    sort_keys=True,
+    default=str,
+  )
+
+
+def _commit_writes(firestore: Client, writes: list[tuple[Any, dict | None]]) -> None:
+  # (reference, data) pairs; data None deletes the document.
+  for start in range(0, len(writes), MAX_BATCH_WRITES):
+    batch = firestore.batch()
+    for ref, data in writes[start : start + MAX_BATCH_WRITES]:
+      if data is None:
+        batch.delete(ref)
+      else:
+        batch.set(ref, data)
+    batch.commit()
+
+
 def _set_subcollection(
-  firestore: Client, product_id: str, name: str, items: list[dict]
-):
+  firestore: Client,
+  product_id: str,
+  name: str,
+  items: list[dict],
+  existing: list[dict] | None = None,
+  writes: list[tuple[Any, dict | None]] | None = None,
+) -> list[dict]:
+  # Diffs the new items against the current children (the embedded list
+  # when the caller has it) and writes only what changed. Items without an
+  # id reuse the id of an unchanged child with the same content. Writes are
+  # committed here unless the caller passes `writes` to collect them.
   coll_ref = firestore.collection("products").document(product_id).collection(name)
-  existing = list(coll_ref.stream())
-  for doc in existing:
-    doc.reference.delete()
+  if existing is None:
+    existing = [_doc_to_dict(doc) for doc in coll_ref.stream()]
+  current = {child["id"]: child for child in existing}
+  by_content: dict[str, list[str]] = {}
+  for child in existing:
+    by_content.setdefault(_child_content(child), []).append(child["id"])
+
+  prepared = []
   for item in items:
-    item_id = item.get("id") or uuid4().hex
     item_data = {**item, "product_id": product_id}
     item_data.pop("id", None)
-    coll_ref.document(item_id).set(item_data)
+    prepared.append((item.get("id"), item_data))
+  claimed = {item_id for item_id, _ in prepared if item_id}
+  for index, (item_id, item_data) in enumerate(prepared):
+    if item_id:
+      continue
+    for candidate in by_content.get(_child_content(item_data), []):
+      if candidate not in claimed:
+        claimed.add(candidate)
+        prepared[index] = (candidate, item_data)
+        break
+
+  changes = []
+  stored = []
+  for item_id, item_data in prepared:
+    item_id = item_id or uuid4().hex
+    previous = current.pop(item_id, None)
+    if previous is None or _child_content(previous) != _child_content(item_data):
+      changes.append((coll_ref.document(item_id), item_data))
+    stored.append({**item_data, "id": item_id})
+  changes.extend((coll_ref.document(stale_id), None) for stale_id in current)
+  if writes is None:
+    _commit_writes(firestore, changes)
+  else:
+    writes.extend(changes)
+  return _sort_children(stored)
+
+
+def _write_children(
+  firestore: Client,
+  product_id: str,
+  payload,
+  skip_empty: bool,
+  current: dict | None = None,
+  writes: list[tuple[Any, dict | None]] | None = None,
+) -> dict[str, list[dict]]:
+  # `current` is the stored product document; None means a new product.
+  embedded = {}
+  for field, name in _PAYLOAD_CHILD_FIELDS.items():
+    values = getattr(payload, field)
+    if values is None or (skip_empty and not values):
+      continue
+    existing = [] if current is None else current.get(name)
+    if not isinstance(existing, list):
+      existing = None
+    stored = _set_subcollection(
+      firestore,
+      product_id,
+      name,
+      [value.model_dump() for value in values],
+      existing,
+      writes,
+    )
+    if existing is None or stored != _sort_children(existing):
+      embedded[name] = stored
+  return embedded
+
+
+def _get_children(firestore: Client, product_id: str, data: dict, name: str) -> list[dict]:
+  embedded = data.get(name)
+  if isinstance(embedded, list):
+    return embedded
+  return _get_subcollection(firestore, product_id, name)
 
 
 def _build_product_response(firestore: Client, product_id: str, data: dict) -> dict:
   return {
     **data,
     "id": product_id,
-    "product_images": _get_subcollection(firestore, product_id, "product_images"),
-    "product_features": _get_subcollection(firestore, product_id, "product_features"),
-    "product_specs": _get_subcollection(firestore, product_id, "product_specs"),
-    "product_benefits": _get_subcollection(firestore, product_id, "product_benefits"),
-    "product_gallery": _get_subcollection(firestore, product_id, "product_gallery"),
+    **{
+      name: _get_children(firestore, product_id, data, name)
+      for name in PRODUCT_CHILD_COLLECTIONS
+    },
   }
 
 
-def list_products(
+def _load_children_batch(
+  firestore: Client, product_ids: list[str], name: str
+) -> dict[str, list[dict]]:
+  # Child documents carry their parent's product_id, so one collection-group
+  # query per chunk loads a child kind for many products at once.
+  grouped: dict[str, list[dict]] = {product_id: [] for product_id in product_ids}
+  for start in range(0, len(product_ids), CHILD_QUERY_CHUNK_SIZE):
+    chunk = product_ids[start : start + CHILD_QUERY_CHUNK_SIZE]
+    docs = firestore.collection_group(name).where("product_id", "in", chunk).stream()
+    for doc in docs:
+      data = _doc_to_dict(doc)
+      if data.get("product_id") in grouped:
+        grouped[data["product_id"]].append(data)
+  return {product_id: _sort_children(items) for product_id, items in grouped.items()}
+
+
+def resolve_fieldset(fields: str | None, include: str | None) -> Fieldset | None:
+  if fields is None and include is None:
+    return None
+  selected = PRODUCT_FIELDS if fields is None else _parse_names(fields, PRODUCT_FIELDS, "fields")
+  included = () if include is None else _parse_names(include, _PAYLOAD_CHILD_FIELDS, "include")
+  return tuple(selected), tuple(_PAYLOAD_CHILD_FIELDS[name] for name in included)
+
+
+def _parse_names(raw: str, allowed, param: str) -> list[str]:
+  names = []
+  for name in raw.split(","):
+    name = name.strip()
+    if not name or name == "id" or name in names:
+      continue
+    if name not in allowed:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Unknown {param} value: {name}",
+      )
+    names.append(name)
+  return names
+
+
+def _build_product_responses(
+  firestore: Client, rows: list[dict], fieldset: Fieldset | None = None
+) -> list[dict]:
+  children = PRODUCT_CHILD_COLLECTIONS if fieldset is None else fieldset[1]
+  loaded = {}
+  for name in children:
+    missing = [row["id"] for row in rows if not isinstance(row.get(name), list)]
+    if missing:
+      loaded[name] = _load_children_batch(firestore, missing, name)
+  products = [
+    {
+      **row,
+      **{
+        name: row[name] if isinstance(row.get(name), list) else loaded[name][row["id"]]
+        for name in children
+      },
+    }
+    for row in rows
+  ]
+  if fieldset is None:
+    return products
+  fields = ("id", *fieldset[0], *children)
+  return [{field: product.get(field) for field in fields} for product in products]
+
+
+def _contains_any(values: list[str], needle: str) -> bool:
+  needle_lower = needle.lower()
+  return any(needle_lower in (value or "").lower() for value in values)
+
+
+def _price_in_range(data: dict, min_price: int | None, max_price: int | None) -> bool:
+  price = data.get("price_idr")
+  if min_price is not None and (price is None or price < min_price):
+    return False
+  if max_price is not None and (price is None or price > max_price):
+    return False
+  return True
+
+
+def _matches_text(data: dict, query_text: str) -> bool:
+  return _contains_any([data.get("title"), data.get("description")], query_text)
+
+
+def resolve_sort(
+  sort: str | None,
+  query_text: str | None,
+  min_price: int | None,
+  max_price: int | None,
+) -> str:
+  if sort == "relevance" and not query_text:
+    sort = None
+  if sort:
+    return sort
+  if query_text:
+    return "relevance"
+  if min_price is not None or max_price is not None:
+    return "price_asc"
+  return "newest"
+
+
+def _cursor_value(sort_field: str, data: dict):
+  value = data.get(sort_field)
+  if sort_field == "sold_count" and value is None:
+    return 0
+  return value
+
+
+def _next_cursor(page: list[dict], limit: int, sort_field: str) -> str | None:
+  if len(page) < limit:
+    return None
+  last = page[-1]
+  return encode_cursor(sort_field, _cursor_value(sort_field, last), last["id"])
+
+
+def _list_from_indexes(
   firestore: Client,
   limit: int,
   offset: int,
+  sort: str,
   query_text: str | None = None,
   min_price: int | None = None,
   max_price: int | None = None,
   feature: str | None = None,
   spec_key: str | None = None,
   spec_value: str | None = None,
+  cursor: str | None = None,
+  fieldset: Fieldset | None = None,
 ):
-  query = firestore.collection("products")
+  _ensure_catalog_indexes(firestore)
+  with _catalog_indexes.lock:
+    products = _catalog_indexes.products
+    facet_bits = None
+    if feature or spec_key or spec_value:
+      facet_bits = _facet_index.filter_bits(feature, spec_key, spec_value)
+    scores = _search_index.search(query_text) if query_text else None
+    if sort == "relevance" and scores is None:
+      sort = "newest"
 
-  if min_price is not None:
-    query = query.where("price_idr", ">=", min_price)
+    def accepts(product_id: str) -> bool:
+      data = products.get(product_id)
+      if data is None or not _price_in_range(data, min_price, max_price):
+        return False
+      if facet_bits is not None and not _facet_index.contains(facet_bits, product_id):
+        return False
+      if query_text:
+        if scores is not None:
+          return product_id in scores
+        return _matches_text(data, query_text)
+      return True
 
-  if max_price is not None:
-    query = query.where("price_idr", "<=", max_price)
+    next_cursor = None
+    if sort == "relevance":
+      ranked = sorted(
+        (-score, product_id) for product_id, score in scores.items() if accepts(product_id)
+      )
+      start = 0
+      if cursor:
+        value, doc_id = decode_cursor(cursor, "relevance")
+        start = bisect_right(ranked, (-value, doc_id))
+        offset = 0
+      rows = ranked[start + offset : start + offset + limit]
+      matched = [products[product_id] for _, product_id in rows]
+      if len(rows) == limit:
+        negative_score, product_id = rows[-1]
+        next_cursor = encode_cursor("relevance", -negative_score, product_id)
+    else:
+      sort_field, direction = PRODUCT_SORTS[sort]
+      after = None
+      if cursor:
+        value, doc_id = decode_cursor(cursor, sort_field)
+        after = (sort_key_value(sort_field, value), doc_id)
+        offset = 0
 
-  if min_price is not None or max_price is not None:
-    query = query.order_by("price_idr")
+      matched = []
+      skipped = 0
+      ordered = _sort_index.scan(
+        sort_field, direction == "DESCENDING", min_price, max_price, after
+      )
+      for product_id in ordered:
+        if not accepts(product_id):
+          continue
+        if skipped < offset:
+          skipped += 1
+          continue
+        matched.append(products[product_id])
+        if len(matched) >= limit:
+          break
+      next_cursor = _next_cursor(matched, limit, sort_field)
+
+  # Child lists may still need Firestore reads, so the page is built after
+  # the index lock is released.
+  page = _build_product_responses(firestore, matched, fieldset)
+  return {"items": page, "next_cursor": next_cursor}
+
+
+def _list_from_snapshot(
+  firestore: Client,
+  snapshot: CatalogSnapshot,
+  limit: int,
+  offset: int,
+  sort: str,
+  min_price: int | None = None,
+  max_price: int | None = None,
+  cursor: str | None = None,
+  fieldset: Fieldset | None = None,
+):
+  # Only plain and price-ranged listings come here; text, feature and spec
+  # filters are answered by the in-memory indexes.
+  sort_field, direction = PRODUCT_SORTS[sort]
+  order = snapshot.orders[sort_field]
+  if sort_field == "price_idr":
+    low, high = snapshot.price_bounds(min_price, max_price)
   else:
-    query = query.order_by("created_at", direction="DESCENDING")
+    low, high = 0, len(order)
 
-  docs = list(query.stream())
+  if cursor:
+    value, doc_id = decode_cursor(cursor, sort_field)
+    cursor_key = (sort_key_value(sort_field, value), doc_id)
+    offset = 0
 
-  results = []
-  for doc in docs:
-    data = _doc_to_dict(doc)
+    def row_key(row: int):
+      return snapshot.sort_key(sort_field, row)
 
-    if query_text:
-      search_text = query_text.lower()
-      title = (data.get("title") or "").lower()
-      description = (data.get("description") or "").lower()
-      if search_text not in title and search_text not in description:
-        continue
+    if direction == "ASCENDING":
+      low = bisect_right(order, cursor_key, lo=low, hi=high, key=row_key)
+    else:
+      high = bisect_left(order, cursor_key, lo=low, hi=high, key=row_key)
 
-    product = _build_product_response(firestore, doc.id, data)
+  check_price = sort_field != "price_idr" and (min_price is not None or max_price is not None)
+  positions = range(low, high) if direction == "ASCENDING" else range(high - 1, low - 1, -1)
 
-    if feature:
-      feature_lower = feature.lower()
-      features = [
-        (f.get("feature") or "").lower() for f in product["product_features"]
-      ]
-      if not any(feature_lower in f for f in features):
-        continue
+  matched = []
+  skipped = 0
+  for position in positions:
+    row = order[position]
+    if check_price and not snapshot.price_in_range(row, min_price, max_price):
+      continue
+    if skipped < offset:
+      skipped += 1
+      continue
+    matched.append(snapshot.row(row))
+    if len(matched) >= limit:
+      break
 
-    if spec_key:
-      spec_key_lower = spec_key.lower()
-      specs = [
-        (s.get("spec_key") or "").lower() for s in product["product_specs"]
-      ]
-      if not any(spec_key_lower in s for s in specs):
-        continue
+  page = _build_product_responses(firestore, matched, fieldset)
 
-    if spec_value:
-      spec_value_lower = spec_value.lower()
-      specs = [
-        (s.get("spec_value") or "").lower() for s in product["product_specs"]
-      ]
-      if not any(spec_value_lower in s for s in specs):
-        continue
+  return {"items": page, "next_cursor": _next_cursor(matched, limit, sort_field)}
 
-    results.append(product)
 
-  return results[offset : offset + limit]
+def _query_products(
+  firestore: Client,
+  limit: int,
+  offset: int,
+  sort: str,
+  cursor: str | None = None,
+  fieldset: Fieldset | None = None,
+):
+  sort_field, direction = PRODUCT_SORTS[sort]
+  query = firestore.collection("products")
+  if fieldset is not None:
+    # Only the requested fields (plus the sort key for the cursor) leave
+    # Firestore, and only included child lists are loaded.
+    query = query.select(sorted({*fieldset[0], *fieldset[1], sort_field}))
+  query = query.order_by(sort_field, direction=direction)
+  query = query.order_by("__name__", direction=direction)
 
+  if cursor:
+    value, doc_id = decode_cursor(cursor, sort_field)
+    query = query.start_after({sort_field: value, "__name__": doc_id})
+  elif offset:
+    query = query.offset(offset)
 
-def get_product(firestore: Client, product_id: str):
-  doc = firestore.collection("products").document(product_id).get()
+  rows = [_doc_to_dict(doc) for doc in query.limit(limit).stream()]
+  page = _build_product_responses(firestore, rows, fieldset)
+  return {"items": page, "next_cursor": _next_cursor(rows, limit, sort_field)}
+
+
+def list_products(
+  firestore: Client,
+  limit: int,
+  offset: int,
+  query_text: str | None = None,
+  min_price: int | None = None,
+  max_price: int | None = None,
+  feature: str | None = None,
+  spec_key: str | None = None,
+  spec_value: str | None = None,
+  cursor: str | None = None,
+  sort: str | None = None,
+  fieldset: Fieldset | None = None,
+):
+  sort = resolve_sort(sort, query_text, min_price, max_price)
+  filters = {
+    "query_text": query_text,
+    "min_price": min_price,
+    "max_price": max_price,
+    "feature": feature,
+    "spec_key": spec_key,
+    "spec_value": spec_value,
+    "cursor": cursor,
+    "fieldset": fieldset,
+  }
+
+  if query_text or feature or spec_key or spec_value:
+    return _list_from_indexes(firestore, limit, offset, sort, **filters)
+
+  # The live mirror beats the snapshot file, which only follows writes made
+  # on this host between rebuilds.
+  if catalog_mirror.is_ready():
+    return _list_from_indexes(firestore, limit, offset, sort, **filters)
+
+  snapshot = _current_snapshot(firestore)
+  if snapshot is not None:
+    return _list_from_snapshot(
+      firestore,
+      snapshot,
+      limit,
+      offset,
+      sort,
+      min_price=min_price,
+      max_price=max_price,
+      cursor=cursor,
+      fieldset=fieldset,
+    )
+
+  # Firestore only serves plain listings in an order it has an index for;
+  # price ranges and popularity are answered by the sorted in-memory arrays.
+  has_range = min_price is not None or max_price is not None
+  if has_range or sort not in FIRESTORE_SORTS:
+    return _list_from_indexes(firestore, limit, offset, sort, **filters)
+
+  cache_key = (limit, offset, sort, cursor, fieldset)
+  cached = _product_list_cache.get(cache_key)
+  if cached is not None:
+    return cached
+
+  result = _query_products(firestore, limit, offset, sort, cursor=cursor, fieldset=fieldset)
+  _product_list_cache.set(cache_key, result)
+  if fieldset is None:
+    for product in result["items"]:
+      _product_cache.set(product["id"], product)
+  return result
+
+
+def _encode_product_list(items: list[dict], fieldset: Fieldset | None) -> bytes:
+  if fieldset is not None:
+    # Sparse items are partial products, so they skip response validation.
+    return json.dumps(
+      jsonable_encoder(items), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+  return _product_list_adapter.dump_json(_product_list_adapter.validate_python(items))
+
+
+def render_product_list(
+  firestore: Client,
+  version: int,
+  limit: int,
+  offset: int,
+  query_text: str | None = None,
+  min_price: int | None = None,
+  max_price: int | None = None,
+  feature: str | None = None,
+  spec_key: str | None = None,
+  spec_value: str | None = None,
+  cursor: str | None = None,
+  sort: str | None = None,
+  fieldset: Fieldset | None = None,
+):
+  # Blank filters behave like missing ones and the default sort is resolved
+  # up front, so equivalent query strings share one entry.
+  query_text = query_text or None
+  feature = feature or None
+  spec_key = spec_key or None
+  spec_value = spec_value or None
+  cursor = cursor or None
+  sort = resolve_sort(sort, query_text, min_price, max_price)
+  cache_key = (
+    version,
+    limit,
+    offset,
+    query_text,
+    min_price,
+    max_price,
+    feature,
+    spec_key,
+    spec_value,
+    cursor,
+    sort,
+    fieldset,
+  )
+  cached = _product_list_response_cache.get(cache_key)
+  if cached is not None:
+    return cached
+
+  result = list_products(
+    firestore,
+    limit,
+    offset,
+    query_text=query_text,
+    min_price=min_price,
+    max_price=max_price,
+    feature=feature,
+    spec_key=spec_key,
+    spec_value=spec_value,
+    cursor=cursor,
+    sort=sort,
+    fieldset=fieldset,
+  )
+  rendered = {
+    "body": _encode_product_list(result["items"], fieldset),
+    "next_cursor": result["next_cursor"],
+  }
+  # A version change seen while rendering may have invalidated the inner
+  # caches mid-request, so the body is only kept if it is still current.
+  if catalog_version.current(firestore) == version:
+    _product_list_response_cache.set(cache_key, rendered)
+  return rendered
+
+
+def _filter_bits(
+  query_text: str | None,
+  min_price: int | None,
+  max_price: int | None,
+  feature: str | None,
+  spec_key: str | None,
+  spec_value: str | None,
+) -> int:
+  # Whole-result-set match as a facet bitset; callers hold the index lock.
+  bits = _facet_index.filter_bits(feature, spec_key, spec_value)
+  if query_text:
+    scores = _search_index.search(query_text)
+    if scores is not None:
+      bits &= _facet_index.bits_for(scores)
+    else:
+      products = _catalog_indexes.products
+      bits = _facet_index.bits_for(
+        product_id
+        for product_id in _facet_index.product_ids(bits)
+        if _matches_text(products[product_id], query_text)
+      )
+  if min_price is not None or max_price is not None:
+    bits &= _facet_index.bits_for(_sort_index.scan("price_idr", False, min_price, max_price))
+  return bits
+
+
+def browse_products(
+  firestore: Client,
+  limit: int,
+  offset: int,
+  query_text: str | None = None,
+  min_price: int | None = None,
+  max_price: int | None = None,
+  feature: str | None = None,
+  spec_key: str | None = None,
+  spec_value: str | None = None,
+  cursor: str | None = None,
+  sort: str | None = None,
+  facet_limit: int = 20,
+):
+  result = list_products(
+    firestore,
+    limit,
+    offset,
+    query_text=query_text,
+    min_price=min_price,
+    max_price=max_price,
+    feature=feature,
+    spec_key=spec_key,
+    spec_value=spec_value,
+    cursor=cursor,
+    sort=sort,
+  )
+
+  _ensure_catalog_indexes(firestore)
+  with _catalog_indexes.lock:
+    bits = _filter_bits(query_text, min_price, max_price, feature, spec_key, spec_value)
+    facets = _facet_index.counts(bits, facet_limit)
+
+  return {**result, "total": bits.bit_count(), "facets": facets}
+
+
+def _lookup_timed_out() -> HTTPException:
+  return HTTPException(
+    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+    detail="Product lookup timed out",
+  )
+
+
+def _remaining_time(deadline: float) -> float:
+  remaining = deadline - time.monotonic()
+  if remaining <= 0:
+    raise _lookup_timed_out()
+  return remaining
+
+
+def _load_product(firestore: Client, product_id: str) -> dict:
+  deadline = time.monotonic() + PRODUCT_DETAIL_TIMEOUT_SECONDS
+  doc = (
+    firestore.collection("products")
+    .document(product_id)
+    .get(timeout=_remaining_time(deadline))
+  )
   if not doc.exists:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
   data = _doc_to_dict(doc)
+
+  # Products without embedded lists need one query per child kind; they are
+  # independent, so they run side by side under the same deadline.
+  missing = [name for name in PRODUCT_CHILD_COLLECTIONS if not isinstance(data.get(name), list)]
+  if missing:
+    timeout = _remaining_time(deadline)
+    futures = {
+      name: _detail_executor.submit(_get_subcollection, firestore, product_id, name, timeout)
+      for name in missing
+    }
+    _, pending = wait(futures.values(), timeout=_remaining_time(deadline))
+    if pending:
+      for future in pending:
+        future.cancel()
+      raise _lookup_timed_out()
+    for name, future in futures.items():
+      data[name] = future.result()
   return _build_product_response(firestore, product_id, data)
 
 
-def create_product(firestore: Client, payload: ProductCreateRequest):
-  product_id = uuid4().hex
+def suggest_products(firestore: Client, prefix: str, limit: int):
+  _ensure_catalog_indexes(firestore)
+  with _catalog_indexes.lock:
+    terms, product_ids = _suggest_index.suggest(prefix, limit)
+    products = [
+      {
+        "id": product_id,
+        "title": data.get("title") or "",
+        "price_idr": data.get("price_idr") or 0,
+        "image_url": data.get("image_url"),
+      }
+      for product_id in product_ids
+      if (data := _catalog_indexes.products.get(product_id)) is not None
+    ]
+  return {"prefix": prefix, "terms": terms, "products": products}
+
+
+def get_product(firestore: Client, product_id: str):
+  if catalog_mirror.is_ready():
+    data = catalog_mirror.get(product_id)
+    if data is None:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    return _build_product_response(firestore, product_id, data)
+
+  snapshot = _current_snapshot(firestore)
+  if snapshot is not None:
+    row = snapshot.find(product_id)
+    if row is not None:
+      return _build_product_response(firestore, product_id, snapshot.row(row))
+
+  cached = _product_cache.get(product_id)
+  if cached is not None:
+    return cached
+
+  product = _load_product(firestore, product_id)
+  _product_cache.set(product_id, product)
+  return product
+
+
+def batch_get_products(firestore: Client, product_ids: list[str]):
+  unique_ids = list(dict.fromkeys(product_ids))
+  found: dict[str, dict] = {}
+
+  if catalog_mirror.is_ready():
+    rows = [data for product_id in unique_ids if (data := catalog_mirror.get(product_id))]
+    found.update((row["id"], row) for row in _build_product_responses(firestore, rows))
+  else:
+    snapshot = _current_snapshot(firestore)
+    rows: dict[str, dict] = {}
+    for product_id in unique_ids:
+      row = snapshot.find(product_id) if snapshot is not None else None
+      if row is not None:
+        rows[product_id] = snapshot.row(row)
+      elif (cached := _product_cache.get(product_id)) is not None:
+        found[product_id] = cached
+
+    # Everything not served from memory is read with a single get_all call.
+    missing = [
+      product_id for product_id in unique_ids if product_id not in found and product_id not in rows
+    ]
+    if missing:
+      products = firestore.collection("products")
+      for doc in firestore.get_all([products.document(product_id) for product_id in missing]):
+        if doc.exists:
+          rows[doc.id] = _doc_to_dict(doc)
+    for product in _build_product_responses(firestore, list(rows.values())):
+      _product_cache.set(product["id"], product)
+      found[product["id"]] = product
+
+  return {
+    "items": [
+      {"id": product_id, "found": product_id in found, "product": found.get(product_id)}
+      for product_id in product_ids
+    ]
+  }
+
+
+def _existing_product_ids(firestore: Client, product_ids: list[str]) -> set[str]:
+  if catalog_mirror.is_ready():
+    return {product_id for product_id in product_ids if catalog_mirror.get(product_id) is not None}
+  products = firestore.collection("products")
+  # An empty field mask only reports whether each document exists.
+  docs = firestore.get_all(
+    [products.document(product_id) for product_id in product_ids], field_paths=[]
+  )
+  return {doc.id for doc in docs if doc.exists}
+
+
+def get_related_products(firestore: Client, product_id: str):
+  cached = _related_cache.get(product_id)
+  if cached is not None:
+    return cached
+  doc = firestore.collection(PRODUCT_RELATED_COLLECTION).document(product_id).get()
+  data = (doc.to_dict() or {}) if doc.exists else {}
+  items = data.get("items") or []
+  # Lists are as old as the last build, so products deleted since then are
+  # dropped here.
+  existing = _existing_product_ids(firestore, [product_id, *(item["id"] for item in items)])
+  if product_id not in existing:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+  related = {
+    "product_id": product_id,
+    "generated_at": data.get("generated_at"),
+    "items": [item for item in items if item["id"] in existing],
+  }
+  _related_cache.set(product_id, related)
+  return related
+
+
+def build_related_products(firestore: Client, limit: int = RELATED_PRODUCTS_LIMIT):
+  # Each list embeds the summaries the product page shows, so serving it
+  # is one document read; they refresh on the next run, like the scores.
+  fieldset = (RELATED_SUMMARY_FIELDS, ("product_features", "product_specs"))
+  rows = _build_product_responses(firestore, _catalog_source(firestore), fieldset)
+  products = sorted(rows, key=lambda product: product["id"])
+  neighbours = top_k_similar(feature_matrix(products), limit)
+
+  related = firestore.collection(PRODUCT_RELATED_COLLECTION)
+  generated_at = datetime.utcnow()
+  writes: list[tuple[Any, dict | None]] = []
+  for product, matches in zip(products, neighbours):
+    items = []
+    for index, score in matches:
+      match = products[index]
+      items.append(
+        {
+          "id": match["id"],
+          **{field: match.get(field) for field in RELATED_SUMMARY_FIELDS},
+          "score": round(score, 4),
+        }
+      )
+    writes.append((related.document(product["id"]), {"items": items, "generated_at": generated_at}))
+
+  current = {product["id"] for product in products}
+  stale = [ref for ref in related.list_documents() if ref.id not in current]
+  writes.extend((ref, None) for ref in stale)
+  _commit_writes(firestore, writes)
+  _related_cache.clear()
+  logger.info("Related products built for %s products.", len(products))
+  return {"products": len(products), "removed": len(stale)}
+
+
+def _remember_products(products: list[dict]):
+  if not products:
+    return
+  _product_list_cache.clear()
+  _product_list_response_cache.clear()
+  for product in products:
+    _product_cache.set(product["id"], product)
+    catalog_mirror.upsert(product["id"], product)
+    _catalog_indexes.upsert(product)
+  _schedule_snapshot_refresh()
+  _schedule_feed_refresh()
+  _schedule_static_publish()
+
+
+def _refresh_product(firestore: Client, product_id: str) -> dict:
+  product = _load_product(firestore, product_id)
+  _remember_products([product])
+  return product
+
+
+def record_sales(quantities: dict[str, int]):
+  # Sales only move sold_count, which leaves the catalog version alone, so
+  # cached pages, the snapshot, the feeds and the static catalog keep their
+  # bytes; only the product cache, the mirror and the popularity sort see it.
+  def sold(product: dict, qty: int) -> dict:
+    return {**product, "sold_count": (product.get("sold_count") or 0) + qty}
+
+  for product_id, qty in quantities.items():
+    _product_cache.update(product_id, lambda product, qty=qty: sold(product, qty))
+    if (mirrored := catalog_mirror.get(product_id)) is not None:
+      catalog_mirror.upsert(product_id, sold(mirrored, qty))
+  with _catalog_indexes.lock:
+    for product_id, qty in quantities.items():
+      if (product := _catalog_indexes.products.get(product_id)) is not None:
+        product = sold(product, qty)
+        _catalog_indexes.products[product_id] = product
+        _sort_index.upsert(product)
+
+
+def _forget_products(product_ids: list[str]):
+  if not product_ids:
+    return
+  _product_list_cache.clear()
+  _product_list_response_cache.clear()
+  # Other products' related lists may name the deleted ones.
+  _related_cache.clear()
+  for product_id in product_ids:
+    _product_cache.invalidate(product_id)
+    catalog_mirror.remove(product_id)
+    _catalog_indexes.remove(product_id)
+  _schedule_snapshot_refresh()
+  _schedule_feed_refresh()
+  _schedule_static_publish()
+
+
+def _changes_since(
+  firestore: Client, since: int, limit: int | None = None, version: int | None = None
+) -> list[tuple[int, str, dict]]:
+  changes = []
+  for collection, kind in (("products", "upsert"), (PRODUCT_TOMBSTONES_COLLECTION, "delete")):
+    query = firestore.collection(collection)
+    if version is not None:
+      query = query.where("catalog_version", "==", version)
+    else:
+      query = query.where("catalog_version", ">", since).order_by("catalog_version")
+      if limit is not None:
+        query = query.limit(limit)
+    for doc in query.stream():
+      data = _doc_to_dict(doc)
+      changes.append((data["catalog_version"], kind, data))
+  changes.sort(key=lambda change: (change[0], change[2]["id"]))
+  return changes
+
+
+def list_product_changes(firestore: Client, since: int, limit: int):
+  current = catalog_version.current(firestore)
+  changes = _changes_since(firestore, since, limit + 1)
+  has_more = len(changes) > limit
+  if has_more:
+    # One write can stamp several products with the same version, so a page
+    # only ends on a version boundary; a version larger than the page is
+    # returned whole.
+    boundary = changes[limit][0]
+    changes = [change for change in changes[:limit] if change[0] < boundary]
+    next_since = boundary - 1
+    if not changes:
+      changes = _changes_since(firestore, since, version=boundary)
+      next_since = boundary
+  else:
+    next_since = max([current, since, *(change[0] for change in changes)])
+
+  upserts = [data for _, kind, data in changes if kind == "upsert"]
+  return {
+    "since": since,
+    "next_since": next_since,
+    "has_more": has_more,
+    "products": _build_product_responses(firestore, upserts),
+    "deleted": [data["id"] for _, kind, data in changes if kind == "delete"],
+  }
+
+
+def _load_catalog(firestore: Client) -> list[dict]:
+  docs = firestore.collection("products").stream()
+  return _build_product_responses(firestore, [_doc_to_dict(doc) for doc in docs])
+
+
+def _catalog_source(firestore: Client) -> list[dict]:
+  if catalog_mirror.is_ready():
+    return catalog_mirror.products()
+  snapshot = _current_snapshot(firestore)
+  if snapshot is not None:
+    return list(snapshot.rows())
+  return _load_catalog(firestore)
+
+
+def _ensure_catalog_indexes(firestore: Client):
+  _catalog_indexes.ensure(
+    lambda: _catalog_source(firestore), live=catalog_mirror.is_ready()
+  )
+
+
+def ensure_catalog_snapshot(firestore: Client, force: bool = False):
+  version = catalog_version.current(firestore)
+  catalog_snapshots.ensure(lambda: _load_catalog(firestore), version, force=force)
+
+
+def _schedule_snapshot_refresh():
+  catalog_snapshots.schedule(
+    lambda: _load_catalog(get_firestore_client()),
+    lambda: catalog_version.current(get_firestore_client()),
+  )
+
+
+def _current_snapshot(firestore: Client) -> CatalogSnapshot | None:
+  # A snapshot behind the catalog version (a write from another host or a
+  # script) is not served; it is rebuilt in the background meanwhile.
+  snapshot = catalog_snapshots.current()
+  if snapshot is None:
+    return None
+  version = catalog_version.current(firestore)
+  if catalog_snapshots.is_stale(snapshot, version):
+    catalog_snapshots.refresh_in_background(lambda: _load_catalog(firestore), version)
+    return None
+  return snapshot
+
+
+def _feed_source(firestore: Client) -> Iterator[dict]:
+  for doc in firestore.collection("products").select(list(FEED_FIELDS)).stream():
+    yield _doc_to_dict(doc)
+
+
+def ensure_product_feeds(firestore: Client, force: bool = False):
+  version = catalog_version.current(firestore)
+  product_feeds.ensure(lambda: _feed_source(firestore), version, force=force)
+
+
+def _schedule_feed_refresh():
+  product_feeds.schedule(
+    lambda: _feed_source(get_firestore_client()),
+    lambda: catalog_version.current(get_firestore_client()),
+  )
+
+
+def get_catalog_cache_stats():
+  return {
+    "caches": [
+      _product_cache.stats(),
+      _product_list_cache.stats(),
+      _product_list_response_cache.stats(),
+      _related_cache.stats(),
+    ],
+    "mirror": catalog_mirror.stats(),
+  }
+
+
+def _static_json(value) -> bytes:
+  return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _static_sort_key(summary: dict) -> tuple[int, str]:
+  # (created_at in microseconds, id): the "newest" order GET /products
+  # serves by default is this key descending. Products without created_at
+  # sort last.
+  created_at = summary.get("created_at")
+  micros = 0
+  if created_at:
+    moment = datetime.fromisoformat(created_at)
+    if moment.tzinfo is None:
+      moment = moment.replace(tzinfo=timezone.utc)
+    micros = int(moment.timestamp() * 1_000_000)
+  return micros, summary["id"]
+
+
+def _static_page_key(sort_key: tuple[int, str]) -> str:
+  return f"{sort_key[0]}-{sort_key[1]}"
+
+
+def _parse_static_page_key(key: str) -> tuple[int, str]:
+  micros, _, product_id = key.partition("-")
+  return int(micros), product_id
+
+
+def _static_pages(summaries: list[dict], page_keys: list[str]) -> tuple[list[str], list[list[dict]]]:
+  # `summaries` are newest first. Pages cover ranges of that order starting
+  # at their key (the first page also takes newer products), so an edit only
+  # changes the page its product falls in and new products land on the
+  # first page. A page grown past twice the page size is split and an
+  # emptied one is dropped.
+  if not page_keys:
+    page_keys = [
+      _static_page_key(_static_sort_key(summary))
+      for summary in summaries[::STATIC_CATALOG_PAGE_SIZE]
+    ]
+  # Ascending, for bisect; page i starts at bounds[-1 - i].
+  bounds = [_parse_static_page_key(key) for key in reversed(page_keys)]
+  groups: list[list[dict]] = [[] for _ in page_keys]
+  for summary in summaries:
+    index = len(bounds) - bisect_left(bounds, _static_sort_key(summary)) - 1
+    groups[max(index, 0)].append(summary)
+
+  keys = []
+  pages = []
+  for key, items in zip(page_keys, groups):
+    if not items:
+      continue
+    while len(items) > 2 * STATIC_CATALOG_PAGE_SIZE:
+      keys.append(key)
+      pages.append(items[:STATIC_CATALOG_PAGE_SIZE])
+      items = items[STATIC_CATALOG_PAGE_SIZE:]
+      key = _static_page_key(_static_sort_key(items[0]))
+    keys.append(key)
+    pages.append(items)
+  if pages:
+    # The first page may have taken products newer than its key; its key
+    # follows them so the keys stay in order.
+    keys[0] = _static_page_key(_static_sort_key(pages[0][0]))
+  return keys, pages
+
+
+def publish_static_catalog(firestore: Client, full: bool = False):
+  root = static_catalog_dir()
+  if not root:
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail="Static catalog directory not configured",
+    )
+  manifest = static_catalog.manifest(root)
+  since = manifest.get("version")
+  page_keys = manifest.get("page_keys")
+  if (
+    manifest.get("page_size") != STATIC_CATALOG_PAGE_SIZE
+    or manifest.get("sort") != STATIC_CATALOG_SORT
+    or not isinstance(page_keys, list)
+  ):
+    page_keys = []
+  index = None
+  if not full and page_keys and isinstance(since, int):
+    index = static_catalog.read_shard(root, manifest, "index")
+
+  version = catalog_version.current(firestore)
+  if index is None:
+    rows = _build_product_responses(firestore, _catalog_source(firestore))
+    summaries: dict[str, dict] = {}
+  else:
+    # Only products written (or deleted) since the published version are
+    # read and rendered; every other product shard is kept as it is.
+    changes = _changes_since(firestore, since)
+    latest = {}
+    for change_version, kind, data in changes:
+      latest[data["id"]] = data if kind == "upsert" else None
+      version = max(version, change_version)
+    rows = _build_product_responses(firestore, [data for data in latest.values() if data])
+    summaries = {
+      summary["id"]: summary
+      for summary in index.get("items") or []
+      if summary["id"] not in latest
+    }
+
+  shards = {}
+  for product in _product_list_adapter.validate_python(rows):
+    name = f"products/{product.id}"
+    data = product.model_dump(mode="json")
+    shards[name] = _static_json(data)
+    summary = {field: data.get(field) for field in ("id", *STATIC_SUMMARY_FIELDS)}
+    summary["path"] = shard_path(name, shards[name])
+    summaries[product.id] = summary
+  rendered = len(shards)
+  kept = {
+    f"products/{product_id}": summary["path"]
+    for product_id, summary in summaries.items()
+    if f"products/{product_id}" not in shards
+  }
+
+  ordered = sorted(summaries.values(), key=_static_sort_key, reverse=True)
+  page_keys, pages = _static_pages(ordered, page_keys)
+  for key, items in zip(page_keys, pages):
+    shards[f"pages/{key}"] = _static_json({"key": key, "items": items})
+  shards["index"] = _static_json({"items": ordered})
+
+  result = static_catalog.publish(
+    root,
+    shards,
+    kept,
+    version=version,
+    products=len(ordered),
+    pages=len(pages),
+    page_keys=page_keys,
+    page_size=STATIC_CATALOG_PAGE_SIZE,
+    sort=STATIC_CATALOG_SORT,
+  )
+  return {
+    "version": version,
+    "products": len(ordered),
+    "pages": len(pages),
+    "rendered": rendered,
+    **result,
+  }
+
+
+def _schedule_static_publish():
+  if static_catalog_dir() and static_catalog_auto_publish():
+    static_catalog.schedule(lambda: publish_static_catalog(get_firestore_client()))
+
+
+def _new_product_data(
+  firestore: Client,
+  product_id: str,
+  payload: ProductCreateRequest,
+  writes: list[tuple[Any, dict | None]] | None = None,
+) -> dict:
+  # Aware, like the values Firestore reads back, since imports cache the
+  # written dicts without re-reading them.
+  now = datetime.now(timezone.utc)
   product_data = {
     "title": payload.title,
     "price_idr": payload.price_idr,
     "price_unit": payload.price_unit,
     "description": payload.description,
     "image_url": payload.image_url,
-    "created_at": datetime.utcnow(),
+    "created_at": now,
+    "updated_at": now,
   }
-  firestore.collection("products").document(product_id).set(product_data)
-
-  if payload.images:
-    _set_subcollection(
-      firestore, product_id, "product_images",
-      [img.model_dump() for img in payload.images]
-    )
-
-  if payload.features:
-    _set_subcollection(
-      firestore, product_id, "product_features",
-      [f.model_dump() for f in payload.features]
-    )
-
-  if payload.specs:
-    _set_subcollection(
-      firestore, product_id, "product_specs",
-      [s.model_dump() for s in payload.specs]
-    )
+  product_data.update(
+    _write_children(firestore, product_id, payload, skip_empty=True, writes=writes)
+  )
+  for name in PRODUCT_CHILD_COLLECTIONS:
+    product_data.setdefault(name, [])
+  return product_data
 
-  if payload.benefits:
-    _set_subcollection(
-      firestore, product_id, "product_benefits",
-      [b.model_dump() for b in payload.benefits]
-    )
 
-  if payload.gallery:
-    _set_subcollection(
-      firestore, product_id, "product_gallery",
-      [g.model_dump() for g in payload.gallery]
-    )
+def create_product(firestore: Client, payload: ProductCreateRequest):
+  product_id = uuid4().hex
+  product_data = _new_product_data(firestore, product_id, payload)
+  doc_ref = firestore.collection("products").document(product_id)
+  catalog_version.commit(
+    firestore,
+    lambda transaction, version: transaction.set(
+      doc_ref, {**product_data, "catalog_version": version}
+    ),
+  )
 
-  return get_product(firestore, product_id)
+  return _refresh_product(firestore, product_id)
 
 
 def update_product(firestore: Client, product_id: str, payload: ProductUpdateRequest):
@@ -187,51 +1349,335 @@ def update_product(firestore: Client, product_id: str, payload: ProductUpdateReq
     }.items() if v is not None
   }
 
-  if update_data:
-    doc_ref.update(update_data)
-
-  if payload.images is not None:
-    _set_subcollection(
-      firestore, product_id, "product_images",
-      [img.model_dump() for img in payload.images]
+  child_writes: list[tuple[Any, dict | None]] = []
+  update_data.update(
+    _write_children(
+      firestore,
+      product_id,
+      payload,
+      skip_empty=False,
+      current=doc.to_dict(),
+      writes=child_writes,
     )
+  )
+  # Child writes that do not fit next to the product in one transaction are
+  # committed first; readers go through the embedded lists, which switch
+  # over together with the rest.
+  overflow = max(len(child_writes) - UPDATE_CHILD_WRITES, 0)
+  _commit_writes(firestore, child_writes[:overflow])
+  child_writes = child_writes[overflow:]
 
-  if payload.features is not None:
-    _set_subcollection(
-      firestore, product_id, "product_features",
-      [f.model_dump() for f in payload.features]
+  def write(transaction, version):
+    for ref, data in child_writes:
+      if data is None:
+        transaction.delete(ref)
+      else:
+        transaction.set(ref, data)
+    transaction.update(
+      doc_ref,
+      {**update_data, "catalog_version": version, "updated_at": datetime.utcnow()},
     )
 
-  if payload.specs is not None:
-    _set_subcollection(
-      firestore, product_id, "product_specs",
-      [s.model_dump() for s in payload.specs]
-    )
+  if update_data or child_writes:
+    catalog_version.commit(firestore, write)
 
-  if payload.benefits is not None:
-    _set_subcollection(
-      firestore, product_id, "product_benefits",
-      [b.model_dump() for b in payload.benefits]
-    )
+  return _refresh_product(firestore, product_id)
 
-  if payload.gallery is not None:
-    _set_subcollection(
-      firestore, product_id, "product_gallery",
-      [g.model_dump() for g in payload.gallery]
-    )
 
-  return get_product(firestore, product_id)
+def _child_refs(doc_ref, name: str, embedded) -> list:
+  # The embedded copy lists every child with its id, so references are built
+  # without a round trip; only documents predating it are listed.
+  if isinstance(embedded, list) and all(child.get("id") for child in embedded):
+    return [doc_ref.collection(name).document(child["id"]) for child in embedded]
+  return list(doc_ref.collection(name).list_documents())
+
+
+def _delete_children(firestore: Client, products: dict[str, dict]) -> dict:
+  # BulkWriter sends the deletes in parallel batches with its own rate
+  # ramp-up and retries.
+  writer = firestore.bulk_writer()
+  failures = []
+
+  def on_error(failure, _writer) -> bool:
+    if failure.attempts < BULK_DELETE_MAX_ATTEMPTS:
+      return True
+    failures.append(failure)
+    return False
+
+  writer.on_write_error(on_error)
+  queued = 0
+  for index, (product_id, data) in enumerate(products.items(), start=1):
+    doc_ref = firestore.collection("products").document(product_id)
+    for name in PRODUCT_CHILD_COLLECTIONS:
+      for child_ref in _child_refs(doc_ref, name, data.get(name)):
+        writer.delete(child_ref)
+        queued += 1
+    if index % 100 == 0:
+      logger.info(
+        "Bulk delete: children of %s/%s products queued (%s documents).",
+        index,
+        len(products),
+        queued,
+      )
+  writer.close()
+  if failures:
+    logger.warning("Bulk delete: %s child documents could not be deleted.", len(failures))
+  return {"child_documents": queued - len(failures), "failed_child_documents": len(failures)}
+
+
+def delete_products(firestore: Client, product_ids: list[str]):
+  unique_ids = list(dict.fromkeys(product_ids))
+  products = firestore.collection("products")
+  tombstones = firestore.collection(PRODUCT_TOMBSTONES_COLLECTION)
+  found_docs = {
+    doc.id: doc.to_dict() or {}
+    for doc in firestore.get_all([products.document(product_id) for product_id in unique_ids])
+    if doc.exists
+  }
+  existing = [product_id for product_id in unique_ids if product_id in found_docs]
+
+  # Products disappear atomically with their tombstones and the version
+  # bump (two writes each, plus the version document, per transaction);
+  # child documents are cleaned up afterwards.
+  chunk_size = (MAX_BATCH_WRITES - 1) // 2
+  for start in range(0, len(existing), chunk_size):
+    chunk = existing[start : start + chunk_size]
+
+    def write(transaction, version: int, chunk=chunk) -> None:
+      deleted_at = datetime.utcnow()
+      for product_id in chunk:
+        transaction.delete(products.document(product_id))
+        transaction.set(
+          tombstones.document(product_id),
+          {"catalog_version": version, "deleted_at": deleted_at},
+        )
+
+    catalog_version.commit(firestore, write)
+  _forget_products(existing)
+
+  found = set(existing)
+  return {
+    "deleted": existing,
+    "not_found": [product_id for product_id in unique_ids if product_id not in found],
+    **_delete_children(firestore, found_docs),
+  }
 
 
 def delete_product(firestore: Client, product_id: str):
-  doc_ref = firestore.collection("products").document(product_id)
-  doc = doc_ref.get()
-  if not doc.exists:
+  result = delete_products(firestore, [product_id])
+  if not result["deleted"]:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+  return {"message": "Product deleted"}
 
-  for coll_name in ["product_images", "product_features", "product_specs", "product_benefits", "product_gallery"]:
-    for sub_doc in doc_ref.collection(coll_name).stream():
-      sub_doc.reference.delete()
 
-  doc_ref.delete()
-  return {"message": "Product deleted"}
+def _import_error(line: int, detail) -> dict:
+  return {"line": line, "error": detail}
+
+
+def import_products(firestore: Client, lines: list[tuple[int, str]]):
+  # One chunk of NDJSON rows: rows are validated, child documents go out in
+  # batched writes, then the products land in one transaction with a single
+  # catalog version bump. Nothing is read back. A failed write fails the
+  # chunk's rows, not the whole import.
+  errors = []
+  rows = []
+  for line_number, raw in lines:
+    try:
+      row = ProductImportRow.model_validate_json(raw)
+    except ValidationError as exc:
+      details = exc.errors(include_url=False, include_context=False, include_input=False)
+      errors.append(_import_error(line_number, details))
+      continue
+    rows.append((line_number, row))
+
+  products = firestore.collection("products")
+  requested = [products.document(row.id) for _, row in rows if row.id]
+  taken = set()
+  if requested:
+    try:
+      taken = {doc.id for doc in firestore.get_all(requested) if doc.exists}
+    except Exception as exc:
+      logger.error("Product import chunk failed: %s", str(exc))
+      errors.extend(_import_error(line_number, "Import failed") for line_number, _ in rows)
+      return {"created": [], "errors": errors}
+
+  seen = set()
+  writes: list[tuple[Any, dict | None]] = []
+  created = []
+  created_lines = []
+  for line_number, row in rows:
+    if row.id in taken or row.id in seen:
+      errors.append(_import_error(line_number, "Product already exists"))
+      continue
+    product_id = row.id or uuid4().hex
+    seen.add(product_id)
+    created.append({**_new_product_data(firestore, product_id, row, writes), "id": product_id})
+    created_lines.append(line_number)
+
+  tombstones = firestore.collection(PRODUCT_TOMBSTONES_COLLECTION)
+  # Generated ids are new; only given ids can belong to a deleted product.
+  given_ids = {row.id for _, row in rows if row.id}
+
+  def write(transaction, version: int) -> None:
+    for product in created:
+      data = {key: value for key, value in product.items() if key != "id"}
+      transaction.set(products.document(product["id"]), {**data, "catalog_version": version})
+      if product["id"] in given_ids:
+        # A re-imported id must not stay in the change feed as deleted.
+        transaction.delete(tombstones.document(product["id"]))
+
+  if created:
+    try:
+      _commit_writes(firestore, writes)
+      version = catalog_version.commit(firestore, write)
+    except Exception as exc:
+      logger.error("Product import chunk failed: %s", str(exc))
+      errors.extend(_import_error(line_number, "Import failed") for line_number in created_lines)
+      try:
+        # Child documents of products that were never created.
+        _commit_writes(firestore, [(ref, None) for ref, _data in writes])
+      except Exception as cleanup_exc:
+        logger.warning("Product import cleanup failed: %s", str(cleanup_exc))
+      return {"created": [], "errors": errors}
+    _remember_products([{**product, "catalog_version": version} for product in created])
+  return {"created": [product["id"] for product in created], "errors": errors}
+
+
+def _export_row(product: dict) -> dict:
+  row = {field: product.get(field) for field in ("id", *PRODUCT_FIELDS)}
+  for field, name in _PAYLOAD_CHILD_FIELDS.items():
+    row[field] = [
+      {key: value for key, value in child.items() if key != "product_id"}
+      for child in product.get(name) or []
+    ]
+  return row
+
+
+def export_products(firestore: Client, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[str]:
+  # Pages through the collection by document id, so memory stays bounded by
+  # one page regardless of catalog size.
+  query = firestore.collection("products").order_by("__name__").limit(page_size)
+  last_id = None
+  while True:
+    page_query = query.start_after({"__name__": last_id}) if last_id else query
+    rows = [_doc_to_dict(doc) for doc in page_query.stream()]
+    for product in _build_product_responses(firestore, rows):
+      yield json.dumps(jsonable_encoder(_export_row(product)), ensure_ascii=False) + "\n"
+    if len(rows) < page_size:
+      return
+    last_id = rows[-1]["id"]
+
+
+def _apply_price_rule(
+  price: int, percent: float | None, absolute: int | None, round_to: int | None
+) -> int:
+  value = Decimal(price) * (1 + Decimal(str(percent or 0)) / 100) + (absolute or 0)
+  if round_to:
+    value = (value / round_to).quantize(Decimal(1), rounding=ROUND_HALF_UP) * round_to
+  return max(0, int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP)))
+
+
+def reprice_products(
+  firestore: Client,
+  query_text: str | None = None,
+  min_price: int | None = None,
+  max_price: int | None = None,
+  feature: str | None = None,
+  spec_key: str | None = None,
+  spec_value: str | None = None,
+  percent: float | None = None,
+  absolute: int | None = None,
+  round_to: int | None = None,
+  dry_run: bool = True,
+):
+  if percent is None and absolute is None and round_to is None:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Provide percent, absolute or round_to",
+    )
+
+  # Products created on other replicas only reach the indexes once this
+  # process has seen their catalog version.
+  catalog_version.refresh(firestore)
+  _ensure_catalog_indexes(firestore)
+  with _catalog_indexes.lock:
+    bits = _filter_bits(query_text, min_price, max_price, feature, spec_key, spec_value)
+    product_ids = _facet_index.product_ids(bits)
+
+  products = firestore.collection("products")
+
+  def reprice(docs) -> list[tuple[dict, int]]:
+    # Prices are recomputed from the stored documents, not the indexes;
+    # deleted products are skipped.
+    repriced = []
+    for doc in docs:
+      if not doc.exists:
+        continue
+      data = _doc_to_dict(doc)
+      if not isinstance(data.get("price_idr"), int):
+        continue
+      if not _price_in_range(data, min_price, max_price):
+        continue
+      new_price = _apply_price_rule(data["price_idr"], percent, absolute, round_to)
+      if new_price != data["price_idr"]:
+        repriced.append((data, new_price))
+    return repriced
+
+  changes = []
+  chunks = 0
+  for start in range(0, len(product_ids), REPRICE_CHUNK_SIZE):
+    refs = [
+      products.document(product_id)
+      for product_id in product_ids[start : start + REPRICE_CHUNK_SIZE]
+    ]
+    if dry_run:
+      repriced = reprice(firestore.get_all(refs))
+    else:
+      # The chunk is read inside the version transaction, so a price edit
+      # made since the selection is repriced from, not overwritten.
+      updated_at = datetime.now(timezone.utc)
+      repriced = []
+
+      def read(transaction, refs=refs, repriced=repriced) -> list[tuple[dict, int]]:
+        repriced[:] = reprice(firestore.get_all(refs, transaction=transaction))
+        return repriced
+
+      def write(transaction, version: int, rows, updated_at=updated_at) -> None:
+        for data, new_price in rows:
+          transaction.update(
+            products.document(data["id"]),
+            {"price_idr": new_price, "catalog_version": version, "updated_at": updated_at},
+          )
+
+      version = catalog_version.commit(firestore, write, read)
+      if version is not None:
+        stored = [
+          {**data, "price_idr": new_price, "catalog_version": version, "updated_at": updated_at}
+          for data, new_price in repriced
+        ]
+        _remember_products(_build_product_responses(firestore, stored))
+        chunks += 1
+    changes.extend(
+      {
+        "id": data["id"],
+        "title": data.get("title") or "",
+        "old_price_idr": data["price_idr"],
+        "new_price_idr": new_price,
+      }
+      for data, new_price in repriced
+    )
+    logger.info(
+      "Bulk reprice: %s/%s products checked, %s price changes%s.",
+      min(start + REPRICE_CHUNK_SIZE, len(product_ids)),
+      len(product_ids),
+      len(changes),
+      " (dry run)" if dry_run else "",
+    )
+
+  return {
+    "dry_run": dry_run,
+    "matched": len(product_ids),
+    "changed": len(changes),
+    "chunks": chunks,
+    "changes": changes,
+  }
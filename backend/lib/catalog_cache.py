@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+logger = logging.getLogger("bafain.catalog_cache")
+
+_MISSING = object()
+
+
+def env_int(name: str, default: int, minimum: int = 1) -> int:
+  raw = os.getenv(name)
+  if not raw:
+    return default
+  try:
+    parsed = int(raw)
+  except ValueError:
+    logger.warning("Invalid integer for %s: %s. Using default %s", name, raw, default)
+    return default
+  return parsed if parsed >= minimum else default
+
+
+def env_float(name: str, default: float, minimum: float = 0.0) -> float:
+  raw = os.getenv(name)
+  if not raw:
+    return default
+  try:
+    parsed = float(raw)
+  except ValueError:
+    logger.warning("Invalid number for %s: %s. Using default %s", name, raw, default)
+    return default
+  return parsed if parsed >= minimum else default
+
+
+class LruTtlCache:
+  def __init__(self, name: str, max_entries: int, ttl_seconds: float) -> None:
+    self.name = name
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self.hits = 0
+    self.misses = 0
+    self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key: Hashable, default: Any = None) -> Any:
+    now = time.monotonic()
+    with self._lock:
+      entry = self._entries.get(key, _MISSING)
+      if entry is _MISSING:
+        self.misses += 1
+        return default
+      expires_at, value = entry
+      if expires_at <= now:
+        del self._entries[key]
+        self.misses += 1
+        return default
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return value
+
+  def set(self, key: Hashable, value: Any) -> None:
+    expires_at = time.monotonic() + self.ttl_seconds
+    with self._lock:
+      self._entries[key] = (expires_at, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def update(self, key: Hashable, change: Callable[[Any], Any]) -> None:
+    # Replaces a live entry, keeping its expiry; absent or expired entries
+    # are left alone.
+    with self._lock:
+      entry = self._entries.get(key, _MISSING)
+      if entry is _MISSING or entry[0] <= time.monotonic():
+        return
+      self._entries[key] = (entry[0], change(entry[1]))
+
+  def invalidate(self, key: Hashable) -> None:
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self) -> dict[str, Any]:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        "name": self.name,
+        "size": len(self._entries),
+        "max_entries": self.max_entries,
+        "ttl_seconds": self.ttl_seconds,
+        "hits": self.hits,
+        "misses": self.misses,
+        "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+      }
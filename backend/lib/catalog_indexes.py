@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Protocol
+
+logger = logging.getLogger("bafain.catalog_indexes")
+
+
+class CatalogIndex(Protocol):
+  def fresh(self) -> "CatalogIndex": ...
+
+  def rebuild(self, products: list[dict[str, Any]]) -> None: ...
+
+  def upsert(self, product: dict[str, Any]) -> None: ...
+
+  def remove(self, product_id: str) -> None: ...
+
+
+class CatalogIndexes:
+  def __init__(self, ttl_seconds: float) -> None:
+    self.ttl_seconds = ttl_seconds
+    self.products: dict[str, dict[str, Any]] = {}
+    self.lock = threading.RLock()
+    self._indexes: list[CatalogIndex] = []
+    self._built_at: float | None = None
+    self._stale = False
+    # Bumped by every install and invalidate; a rebuild that started on an
+    # older generation is discarded.
+    self._generation = 0
+    # Writes seen while a rebuild is loading, replayed onto its result.
+    self._pending: list[tuple[str, Any]] | None = None
+    self._building = 0
+
+  def register(self, index: CatalogIndex) -> None:
+    with self.lock:
+      self._indexes.append(index)
+      if self._built_at is not None:
+        index.rebuild(list(self.products.values()))
+
+  def _is_fresh(self, live: bool) -> bool:
+    if self._built_at is None or self._stale:
+      return False
+    return live or time.monotonic() - self._built_at < self.ttl_seconds
+
+  def ensure(self, loader: Callable[[], list[dict[str, Any]]], live: bool = False) -> None:
+    # `live` means a change feed (the catalog mirror) keeps the indexes
+    # current, so they never expire. The load and the build run outside the
+    # lock, so readers keep using the current indexes meanwhile.
+    while True:
+      with self.lock:
+        if self._is_fresh(live):
+          return
+        generation = self._generation
+        indexes = list(self._indexes)
+        if self._pending is None:
+          self._pending = []
+        self._building += 1
+      try:
+        if self._build(loader, generation, indexes):
+          return
+      finally:
+        with self.lock:
+          self._building -= 1
+          if not self._building:
+            self._pending = None
+
+  def _build(
+    self,
+    loader: Callable[[], list[dict[str, Any]]],
+    generation: int,
+    indexes: list[CatalogIndex],
+  ) -> bool:
+    started = time.monotonic()
+    products = loader()
+    built = []
+    for index in indexes:
+      fresh = index.fresh()
+      fresh.rebuild(products)
+      built.append(fresh)
+
+    with self.lock:
+      if generation != self._generation or indexes != self._indexes:
+        # Another rebuild won or the catalog was invalidated meanwhile.
+        return False
+      catalog = {product["id"]: product for product in products}
+      for action, value in self._pending or ():
+        if action == "upsert":
+          catalog[value["id"]] = value
+          for fresh in built:
+            fresh.upsert(value)
+        else:
+          catalog.pop(value, None)
+          for fresh in built:
+            fresh.remove(value)
+      # Index objects are shared by reference, so the built state is moved
+      # into them rather than replacing them.
+      for index, fresh in zip(indexes, built):
+        vars(index).update(vars(fresh))
+      self.products = catalog
+      self._generation += 1
+      self._built_at = time.monotonic()
+      self._stale = False
+    logger.info(
+      "Catalog indexes rebuilt for %s products in %.1f ms.",
+      len(catalog),
+      (time.monotonic() - started) * 1000,
+    )
+    return True
+
+  def invalidate(self) -> None:
+    # The next ensure() rebuilds from the loader, even when live; a rebuild
+    # already loading may have missed the change, so it starts over.
+    with self.lock:
+      self._stale = True
+      self._generation += 1
+
+  def upsert(self, product: dict[str, Any]) -> None: ...
+
+  def remove(self, product_id: str) -> None: ...
+
+
+class CatalogIndexes:
+  def __init__(self, ttl_seconds: float) -> None:
+    self.ttl_seconds = ttl_seconds
+    self.products: dict[str, dict[str, Any]] = {}
+    self.lock = threading.RLock()
+    self._indexes: list[CatalogIndex] = []
+    self._built_at: float | None = None
+    self._stale = False
+    # Bumped by every install and invalidate; a rebuild that started on an
+    # older generation is discarded.
+    self._generation = 0
+    # Writes seen while a rebuild is loading, replayed onto its result.
+    self._pending: list[tuple[str, Any]] | None = None
+    self._building = 0
+
+  def register(self, index: CatalogIndex) -> None:
+    with self.lock:
+      self._indexes.append(index)
+      if self._built_at is not None:
+        index.rebuild(list(self.products.values()))
+
+  def _is_fresh(self, live: bool) -> bool:
+    if self._built_at is None or self._stale:
+      return False
+    return live or time.monotonic() - self._built_at < self.ttl_seconds
+
+  def ensure(self, loader: Callable[[], list[dict[str, Any]]], live: bool = False) -> None:
+    # `live` means a change feed (the catalog mirror) keeps the indexes
+    # current, so they never expire. The load and the build run outside the
+    # lock, so readers keep using the current indexes meanwhile.
+    while True:
+      with self.lock:
+        if self._is_fresh(live):
+          return
+        generation = self._generation
+        if self._pending is None:
+          self._pending = []
+        indexes = list(self._indexes)
+
+      started = time.monotonic()
+      products = loader()
+      built = []
+      for index in indexes:
+        fresh = index.fresh()
+        fresh.rebuild(products)
+        built.append(fresh)
+
+      with self.lock:
+        if generation != self._generation or indexes != self._indexes:
+          # Another rebuild won or the catalog was invalidated meanwhile.
+          continue
+        catalog = {product["id"]: product for product in products}
+        for action, value in self._pending or ():
+          if action == "upsert":
+            catalog[value["id"]] = value
+            for fresh in built:
+              fresh.upsert(value)
+          else:
+            catalog.pop(value, None)
+            for fresh in built:
+              fresh.remove(value)
+        # Index objects are shared by reference, so the built state is moved
+        # into them rather than replacing them.
+        for index, fresh in zip(indexes, built):
+          vars(index).update(vars(fresh))
+        self.products = catalog
+        self._pending = None
+        self._generation += 1
+        self._built_at = time.monotonic()
+        self._stale = False
+        logger.info(
+          "Catalog indexes rebuilt for %s products in %.1f ms.",
+          len(catalog),
+          (self._built_at - started) * 1000,
+        )
+        return
+
+  def invalidate(self) -> None:
+    # The next ensure() rebuilds from the loader, even when live; a rebuild
+    # already loading may have missed the change, so it starts over.
+    with self.lock:
+      self._stale = True
+      self._generation += 1
+      self._pending = None
+
+  def upsert(self, product: dict[str, Any]) -> None:
+    with self.lock:
+      if self._pending is not None:
+        self._pending.append(("upsert", product))
+      if self._built_at is None:
+        return
+      self.products[product["id"]] = product
+      for index in self._indexes:
+        index.upsert(product)
+
+  def remove(self, product_id: str) -> None:
+    with self.lock:
+      if self._pending is not None:
+        self._pending.append(("remove", product_id))
+      if self._built_at is None:
+        return
+      self.products.pop(product_id, None)
+      for index in self._indexes:
+        index.remove(product_id)
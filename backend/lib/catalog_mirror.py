@@ -0,0 +1,105 @@
+import logging
+import os
+import threading
+from typing import Any
+
+from google.cloud.firestore_v1 import Client
+from google.cloud.firestore_v1.watch import ChangeType
+
+logger = logging.getLogger("bafain.catalog_mirror")
+
+
+def catalog_mirror_enabled() -> bool:
+  raw = (os.getenv("PRODUCT_CATALOG_MIRROR") or "").strip().lower()
+  return raw in {"1", "true", "yes"}
+
+
+class CatalogMirror:
+  def __init__(self) -> None:
+    self._products: dict[str, dict[str, Any]] = {}
+    self._lock = threading.Lock()
+    self._ready = threading.Event()
+    self._watch = None
+    self._listeners = []
+    self.version = 0
+
+  # Listeners expose upsert(product) and remove(product_id).
+  def add_listener(self, listener) -> None:
+    self._listeners.append(listener)
+
+  def start(self, firestore: Client) -> None:
+    if self._watch is not None:
+      return
+    # Child lists are embedded in the product documents, so one listener on
+    # `products` also delivers image/feature/spec/benefit/gallery edits.
+    self._watch = firestore.collection("products").on_snapshot(self._on_snapshot)
+    logger.info("Catalog mirror listener started.")
+
+  def stop(self) -> None:
+    if self._watch is not None:
+      self._watch.unsubscribe()
+      self._watch = None
+    self._ready.clear()
+
+  def is_ready(self) -> bool:
+    return self._ready.is_set()
+
+  def _on_snapshot(self, _docs, changes, _read_time) -> None:
+    applied = []
+    with self._lock:
+      for change in changes:
+        doc = change.document
+        if change.type == ChangeType.REMOVED:
+          self._products.pop(doc.id, None)
+          applied.append((doc.id, None))
+          continue
+        data = doc.to_dict() or {}
+        data["id"] = doc.id
+        self._products[doc.id] = data
+        applied.append((doc.id, data))
+      self.version += 1
+    for listener in self._listeners:
+      for product_id, data in applied:
+        if data is None:
+          listener.remove(product_id)
+        else:
+          listener.upsert(data)
+    if not self._ready.is_set():
+      logger.info("Catalog mirror synced %s products.", len(self._products))
+      self._ready.set()
+
+  # Local writes are applied immediately so this process reads its own
+  # writes before the listener delivers them.
+  def upsert(self, product_id: str, data: dict[str, Any]) -> None:
+    if self._watch is None:
+      return
+    with self._lock:
+      self._products[product_id] = {**data, "id": product_id}
+      self.version += 1
+
+  def remove(self, product_id: str) -> None:
+    if self._watch is None:
+      return
+    with self._lock:
+      self._products.pop(product_id, None)
+      self.version += 1
+
+  def get(self, product_id: str) -> dict[str, Any] | None:
+    with self._lock:
+      return self._products.get(product_id)
+
+  def products(self) -> list[dict[str, Any]]:
+    with self._lock:
+      return list(self._products.values())
+
+  def stats(self) -> dict[str, Any]:
+    with self._lock:
+      return {
+        "enabled": self._watch is not None,
+        "ready": self._ready.is_set(),
+        "products": len(self._products),
+        "version": self.version,
+      }
+
+
+catalog_mirror = CatalogMirror()
@@ -0,0 +1,378 @@
+import array
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Any, Callable, Iterator
+
+from lib.catalog_cache import env_float, env_int
+from lib.file_lock import file_lock
+
+logger = logging.getLogger("bafain.catalog_snapshot")
+
+MAGIC = b"BFCS"
+FORMAT_VERSION = 4
+MISSING_PRICE = -1
+# Upper bound on the age of a full rebuild; writes that do not bump the
+# catalog version (sold_count) only reach other hosts' snapshots this way.
+CATALOG_SNAPSHOT_MAX_AGE_SECONDS = env_int("PRODUCT_CATALOG_SNAPSHOT_MAX_AGE_SECONDS", 3600)
+
+# magic, format version, generation, row count, catalog version, built at
+_HEADER = struct.Struct("<4sIQQQd")
+# Fixed-width columns are arrays of one struct code; string tables are a
+# UTF-8 blob plus an offsets column with rows + 1 entries.
+_COLUMNS = {
+  "price": "q",
+  "created_at": "d",
+  "sold_count": "q",
+  "order_id": "Q",
+  "order_created_at": "Q",
+  "order_price": "Q",
+  "order_sold_count": "Q",
+}
+_STRING_TABLES = ("ids", "rows")
+_SECTION_NAMES = tuple(_COLUMNS) + tuple(
+  part for table in _STRING_TABLES for part in (f"{table}_offsets", f"{table}_blob")
+)
+_SECTION_ENTRY = struct.Struct("<QQ")
+_ALIGN = 8
+
+
+def catalog_snapshot_path() -> str | None:
+  path = (os.getenv("PRODUCT_CATALOG_SNAPSHOT_PATH") or "").strip()
+  return path or None
+
+
+def _json_default(value: Any):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(f"Unsupported snapshot value: {type(value).__name__}")
+
+
+def _string_table(values: list[bytes]) -> tuple[array.array, bytes]:
+  offsets = array.array("Q", [0])
+  total = 0
+  for value in values:
+    total += len(value)
+    offsets.append(total)
+  return offsets, b"".join(values)
+
+
+def _timestamp(value: Any) -> float:
+  if isinstance(value, datetime):
+    return value.timestamp()
+  return math.nan
+
+
+def write_snapshot(
+  path: str,
+  products: list[dict],
+  generation: int,
+  catalog_version: int,
+  built_at: float,
+) -> None:
+  products = sorted(products, key=lambda product: product["id"])
+  count = len(products)
+  ids = [product["id"] for product in products]
+
+  prices = array.array(
+    "q",
+    [
+      product["price_idr"] if isinstance(product.get("price_idr"), int) else MISSING_PRICE
+      for product in products
+    ],
+  )
+  created = array.array("d", [_timestamp(product.get("created_at")) for product in products])
+  sold = array.array("q", [product.get("sold_count") or 0 for product in products])
+  order_created = array.array(
+    "Q",
+    sorted(
+      (i for i in range(count) if not math.isnan(created[i])),
+      key=lambda i: (created[i], ids[i]),
+    ),
+  )
+  order_price = array.array(
+    "Q",
+    sorted(
+      (i for i in range(count) if prices[i] != MISSING_PRICE),
+      key=lambda i: (prices[i], ids[i]),
+    ),
+  )
+  order_sold = array.array("Q", sorted(range(count), key=lambda i: (sold[i], ids[i])))
+
+  tables = {
+    "ids": [product_id.encode("utf-8") for product_id in ids],
+    "rows": [
+      json.dumps(p, default=_json_default, separators=(",", ":")).encode("utf-8")
+      for p in products
+    ],
+  }
+
+  sections: dict[str, bytes] = {
+    "price": prices.tobytes(),
+    "created_at": created.tobytes(),
+    "sold_count": sold.tobytes(),
+    "order_id": array.array("Q", range(count)).tobytes(),
+    "order_created_at": order_created.tobytes(),
+    "order_price": order_price.tobytes(),
+    "order_sold_count": order_sold.tobytes(),
+  }
+  for table, values in tables.items():
+    offsets, blob = _string_table(values)
+    sections[f"{table}_offsets"] = offsets.tobytes()
+    sections[f"{table}_blob"] = blob
+
+  position = _HEADER.size + _SECTION_ENTRY.size * len(_SECTION_NAMES)
+  entries = []
+  body = []
+  for name in _SECTION_NAMES:
+    padding = -position % _ALIGN
+    body.append(b"\x00" * padding)
+    position += padding
+    data = sections[name]
+    entries.append(_SECTION_ENTRY.pack(position, len(data)))
+    body.append(data)
+    position += len(data)
+
+  tmp_path = f"{path}.{os.getpid()}.tmp"
+  with open(tmp_path, "wb") as handle:
+    handle.write(
+      _HEADER.pack(MAGIC, FORMAT_VERSION, generation, count, catalog_version, built_at)
+    )
+    handle.writelines(entries)
+    handle.writelines(body)
+    handle.flush()
+    os.fsync(handle.fileno())
+  os.replace(tmp_path, path)
+
+
+class CatalogSnapshot:
+  def __init__(self, path: str) -> None:
+    with open(path, "rb") as handle:
+      self._mm = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version = struct.unpack_from("<4sI", self._mm, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+      self._mm.close()
+      raise ValueError(f"Unsupported catalog snapshot format: {path}")
+    _magic, _version, generation, count, catalog_version, built_at = _HEADER.unpack_from(
+      self._mm, 0
+    )
+    self.generation = generation
+    self.count = count
+    # The catalog version every row is known to reflect, and when the rows
+    # were last loaded in full.
+    self.catalog_version = catalog_version
+    self.built_at = built_at
+
+    view = memoryview(self._mm)
+    self._views = [view]
+    self._sections: dict[str, tuple[int, int]] = {}
+    for index, name in enumerate(_SECTION_NAMES):
+      offset, length = _SECTION_ENTRY.unpack_from(
+        self._mm, _HEADER.size + index * _SECTION_ENTRY.size
+      )
+      self._sections[name] = (offset, length)
+
+    def column(name: str):
+      offset, length = self._sections[name]
+      raw = view[offset : offset + length]
+      typed = raw.cast(_COLUMNS.get(name, "Q"))
+      self._views.extend([typed, raw])
+      return typed
+
+    self.price = column("price")
+    self.created_at = column("created_at")
+    self.sold_count = column("sold_count")
+    self.orders = {
+      "id": column("order_id"),
+      "created_at": column("order_created_at"),
+      "price_idr": column("order_price"),
+      "sold_count": column("order_sold_count"),
+    }
+    self._offsets = {table: column(f"{table}_offsets") for table in _STRING_TABLES}
+    self._blob_starts = {table: self._sections[f"{table}_blob"][0] for table in _STRING_TABLES}
+
+  def close(self) -> None:
+    for view in reversed(self._views):
+      view.release()
+    self._mm.close()
+
+  def _span(self, table: str, row: int) -> tuple[int, int]:
+    offsets = self._offsets[table]
+    base = self._blob_starts[table]
+    return base + offsets[row], base + offsets[row + 1]
+
+  def product_id(self, row: int) -> str:
+    start, end = self._span("ids", row)
+    return self._mm[start:end].decode("utf-8")
+
+  def row(self, row: int) -> dict[str, Any]:
+    start, end = self._span("rows", row)
+    data = json.loads(self._mm[start:end])
+    created_at = data.get("created_at")
+    if isinstance(created_at, str):
+      data["created_at"] = datetime.fromisoformat(created_at)
+    return data
+
+  def rows(self) -> Iterator[dict[str, Any]]:
+    for row in range(self.count):
+      yield self.row(row)
+
+  def sort_key(self, sort_field: str, row: int) -> tuple[Any, str]:
+    if sort_field == "price_idr":
+      return self.price[row], self.product_id(row)
+    if sort_field == "sold_count":
+      return self.sold_count[row], self.product_id(row)
+    return self.created_at[row], self.product_id(row)
+
+  def find(self, product_id: str) -> int | None:
+    index = bisect_left(self.orders["id"], product_id, key=self.product_id)
+    if index < self.count and self.product_id(index) == product_id:
+      return index
+    return None
+
+  def price_in_range(self, row: int, min_price: int | None, max_price: int | None) -> bool:
+    price = self.price[row]
+    if price == MISSING_PRICE:
+      return False
+    if min_price is not None and price < min_price:
+      return False
+    return max_price is None or price <= max_price
+
+  def price_bounds(self, min_price: int | None, max_price: int | None) -> tuple[int, int]:
+    order = self.orders["price_idr"]
+    low = 0
+    high = len(order)
+    if min_price is not None:
+      low = bisect_left(order, min_price, key=lambda row: self.price[row])
+    if max_price is not None:
+      high = bisect_right(order, max_price, key=lambda row: self.price[row])
+    return low, max(low, high)
+
+
+class CatalogSnapshotStore:
+  def __init__(self, delay_seconds: float = 2.0) -> None:
+    self.delay_seconds = delay_seconds
+    self._snapshot: CatalogSnapshot | None = None
+    self._stamp: tuple[int, int, int] | None = None
+    self._lock = threading.Lock()
+    self._refreshing = False
+    self._timer: threading.Timer | None = None
+
+  def current(self) -> CatalogSnapshot | None:
+    path = catalog_snapshot_path()
+    if not path:
+      return None
+    try:
+      stat = os.stat(path)
+    except FileNotFoundError:
+      return None
+    stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with self._lock:
+      if stamp != self._stamp:
+        # Old maps are left for the garbage collector; requests may still
+        # be reading rows from them.
+        try:
+          self._snapshot = CatalogSnapshot(path)
+        except (OSError, ValueError) as exc:
+          logger.warning("Catalog snapshot unreadable: %s", str(exc))
+          self._snapshot = None
+        self._stamp = stamp
+      return self._snapshot
+
+  def is_stale(self, snapshot: CatalogSnapshot, catalog_version: int) -> bool:
+    if snapshot.catalog_version < catalog_version:
+      return True
+    return time.time() - snapshot.built_at > CATALOG_SNAPSHOT_MAX_AGE_SECONDS
+
+  def _open_existing(self, path: str) -> CatalogSnapshot | None:
+    try:
+      return CatalogSnapshot(path)
+    except FileNotFoundError:
+      return None
+    except (OSError, ValueError) as exc:
+      logger.warning("Catalog snapshot unreadable, rebuilding: %s", str(exc))
+      return None
+
+  def ensure(
+    self, loader: Callable[[], list[dict]], catalog_version: int, force: bool = False
+  ) -> None:
+    # `catalog_version` must be read before calling, so the loaded rows are
+    # at least that new. A snapshot behind it, or too old, is rebuilt.
+    path = catalog_snapshot_path()
+    if not path:
+      return
+    with file_lock(f"{path}.lock"):
+      generation = 1
+      snapshot = self._open_existing(path)
+      if snapshot is not None:
+        stale = self.is_stale(snapshot, catalog_version)
+        generation = snapshot.generation + 1
+        snapshot.close()
+        if not force and not stale:
+          return
+      products = loader()
+      write_snapshot(path, products, generation, catalog_version, time.time())
+      logger.info(
+        "Catalog snapshot written with %s products at catalog version %s.",
+        len(products),
+        catalog_version,
+      )
+
+  def refresh_in_background(self, loader: Callable[[], list[dict]], catalog_version: int) -> None:
+    with self._lock:
+      if self._refreshing:
+        return
+      self._refreshing = True
+
+    def run() -> None:
+      try:
+        self.ensure(loader, catalog_version)
+      except Exception as exc:
+        logger.error("Catalog snapshot refresh failed: %s", str(exc))
+      finally:
+        with self._lock:
+          self._refreshing = False
+
+    threading.Thread(target=run, name="catalog-snapshot-refresh", daemon=True).start()
+
+  def schedule(
+    self, loader: Callable[[], list[dict]], catalog_version: Callable[[], int]
+  ) -> None:
+    # A product write moves the catalog version past the file, which is
+    # enough to keep readers off it; the rebuild runs in the background once
+    # the writes settle, so a burst of edits costs one full load.
+    path = catalog_snapshot_path()
+    if not path or not os.path.exists(path):
+      return
+    with self._lock:
+      if self._timer is not None:
+        return
+      self._timer = threading.Timer(
+        self.delay_seconds, self._run_scheduled, args=(loader, catalog_version)
+      )
+      self._timer.daemon = True
+      self._timer.start()
+
+  def _run_scheduled(
+    self, loader: Callable[[], list[dict]], catalog_version: Callable[[], int]
+  ) -> None:
+    with self._lock:
+      self._timer = None
+    try:
+      version = catalog_version()
+    except Exception as exc:
+      logger.error("Catalog snapshot refresh failed: %s", str(exc))
+      return
+    self.refresh_in_background(loader, version)
+
+
+catalog_snapshots = CatalogSnapshotStore(
+  delay_seconds=env_float("PRODUCT_CATALOG_SNAPSHOT_REBUILD_DELAY_SECONDS", 2.0)
+)
@@ -0,0 +1,131 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from fastapi import Response, status
+from google.cloud.firestore_v1 import Client, Transaction, transactional
+
+from lib.catalog_cache import env_int
+
+CATALOG_META_COLLECTION = "catalog_meta"
+CATALOG_META_DOCUMENT = "products"
+PRODUCT_HTTP_MAX_AGE_SECONDS = env_int("PRODUCT_HTTP_MAX_AGE_SECONDS", 0, minimum=0)
+
+
+def _stored_version(doc) -> int:
+  if not doc.exists:
+    return 0
+  return (doc.to_dict() or {}).get("version") or 0
+
+
+class CatalogVersion:
+  # A single counter in catalog_meta/products, bumped in the same
+  # transaction as every product write. Reads are cached per process for
+  # ttl_seconds so conditional requests usually skip Firestore entirely.
+  def __init__(self, ttl_seconds: float) -> None:
+    self.ttl_seconds = ttl_seconds
+    self._value: int | None = None
+    self._fetched_at = 0.0
+    self._lock = threading.Lock()
+    self._listeners: list[Callable[[int], None]] = []
+
+  def _meta_ref(self, firestore: Client):
+    return firestore.collection(CATALOG_META_COLLECTION).document(CATALOG_META_DOCUMENT)
+
+  # Listeners are called with the new version whenever this process sees a
+  # version it did not write itself, so anything cached from an older
+  # catalog can be dropped before it is served under the new ETag.
+  def add_listener(self, listener: Callable[[int], None]) -> None:
+    self._listeners.append(listener)
+
+  def _advance(self, value: int, own_writes: int = 0) -> None:
+    with self._lock:
+      previous = self._value
+      self._fetched_at = time.monotonic()
+      if previous is not None and value < previous:
+        return
+      self._value = value
+    if previous is not None and value > previous + own_writes:
+      for listener in self._listeners:
+        listener(value)
+
+  def current(self, firestore: Client) -> int:
+    with self._lock:
+      if self._value is not None and time.monotonic() - self._fetched_at < self.ttl_seconds:
+        return self._value
+    return self.refresh(firestore)
+
+  def refresh(self, firestore: Client) -> int:
+    # Reads the stored version now, so writes from other processes are seen
+    # (and the listeners called) before the caller relies on local state.
+    self._advance(_stored_version(self._meta_ref(firestore).get()))
+    with self._lock:
+      return self._value
+
+  def commit(
+    self,
+    firestore: Client,
+    write: Callable[..., None],
+    read: Callable[[Transaction], Any] | None = None,
+  ) -> int | None:
+    # `write` receives the transaction and the new version; it must only
+    # write, since Firestore transactions require reads before writes.
+    # Reads go in `read`, which runs first and whose result is passed to
+    # `write` as a third argument; when it is empty nothing is written and
+    # None is returned.
+    meta_ref = self._meta_ref(firestore)
+
+    @transactional
+    def run(transaction: Transaction) -> int | None:
+      version = _stored_version(meta_ref.get(transaction=transaction)) + 1
+      if read is None:
+        write(transaction, version)
+      else:
+        state = read(transaction)
+        if not state:
+          return None
+        write(transaction, version, state)
+      transaction.set(
+        meta_ref,
+        {"version": version, "updated_at": datetime.now(timezone.utc)},
+        merge=True,
+      )
+      return version
+
+    version = run(firestore.transaction())
+    if version is not None:
+      self._advance(version, own_writes=1)
+    return version
+
+
+def catalog_etag(version: int) -> str:
+  return f'"catalog-{version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+  if not if_none_match:
+    return False
+  for candidate in if_none_match.split(","):
+    candidate = candidate.strip()
+    if candidate == "*" or candidate.removeprefix("W/") == etag:
+      return True
+  return False
+
+
+def apply_catalog_cache_headers(response: Response, etag: str) -> None:
+  response.headers["ETag"] = etag
+  response.headers["Cache-Control"] = (
+    f"public, max-age={PRODUCT_HTTP_MAX_AGE_SECONDS}, must-revalidate"
+  )
+
+
+def not_modified_response(etag: str) -> Response:
+  response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+  apply_catalog_cache_headers(response, etag)
+  return response
+
+
+catalog_version = CatalogVersion(
+  ttl_seconds=env_int("PRODUCT_CATALOG_VERSION_TTL_SECONDS", 5, minimum=0)
+)
@@ -0,0 +1,14 @@
+import fcntl
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(path: str):
+  # Exclusive advisory lock on `path` (created if missing), so processes on
+  # the same host take turns rewriting the files it guards.
+  with open(path, "w") as lock_file:
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    try:
+      yield
+    finally:
+      fcntl.flock(lock_file, fcntl.LOCK_UN)
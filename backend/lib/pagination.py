@@ -0,0 +1,73 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException, Response, status
+
+# Sort fields whose cursor value is a plain JSON number.
+NUMERIC_SORT_FIELDS = ("price_idr", "sold_count", "relevance")
+
+
+def _invalid_cursor() -> HTTPException:
+  return HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Invalid cursor",
+  )
+
+
+def encode_cursor(sort_field: str, value: Any, doc_id: str) -> str:
+  if isinstance(value, datetime):
+    encoded_value = {"dt": value.isoformat()}
+  else:
+    encoded_value = value
+  raw = json.dumps(
+    {"s": sort_field, "v": encoded_value, "id": doc_id},
+    separators=(",", ":"),
+  )
+  return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str) -> tuple[Any, str]:
+  padded = cursor + "=" * (-len(cursor) % 4)
+  try:
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+  except (binascii.Error, UnicodeError, ValueError) as exc:
+    raise _invalid_cursor() from exc
+
+  if not isinstance(payload, dict) or payload.get("s") != sort_field:
+    raise _invalid_cursor()
+
+  doc_id = payload.get("id")
+  if not isinstance(doc_id, str) or not doc_id:
+    raise _invalid_cursor()
+
+  value = payload.get("v")
+  if sort_field == "created_at":
+    if not isinstance(value, dict):
+      raise _invalid_cursor()
+    try:
+      value = datetime.fromisoformat(value["dt"])
+    except (KeyError, TypeError, ValueError) as exc:
+      raise _invalid_cursor() from exc
+  elif sort_field in NUMERIC_SORT_FIELDS:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+      raise _invalid_cursor()
+  else:
+    raise _invalid_cursor()
+
+  return value, doc_id
+
+
+def apply_pagination_headers(
+  response: Response,
+  next_cursor: str | None,
+  offset: int,
+  cursor: str | None,
+) -> None:
+  if next_cursor:
+    response.headers["X-Next-Cursor"] = next_cursor
+  if offset and not cursor:
+    # Offset paging is kept for existing clients but scans every skipped row.
+    response.headers["Deprecation"] = "true"
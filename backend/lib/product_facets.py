@@ -0,0 +1,182 @@
+from collections import defaultdict
+from typing import Any, Iterable
+
+from lib.text_normalize import words
+
+
+def normalize_facet(value: Any) -> str:
+  if not isinstance(value, str):
+    return ""
+  return " ".join(words(value))
+
+
+def _bit_positions(bits: int) -> Iterable[int]:
+  while bits:
+    lowest = bits & -bits
+    yield lowest.bit_length() - 1
+    bits ^= lowest
+
+
+class ProductFacetIndex:
+  # Products get a dense ordinal; every facet value maps to an int bitset of
+  # ordinals so filters and counts are big-int AND/OR plus bit_count().
+  def __init__(self) -> None:
+    self._reset()
+
+  def _reset(self) -> None:
+    self._ordinals: dict[str, int] = {}
+    self._product_ids: list[str | None] = []
+    self._free: list[int] = []
+    self._all_bits = 0
+    self._features: dict[str, int] = defaultdict(int)
+    self._spec_keys: dict[str, int] = defaultdict(int)
+    self._spec_values: dict[str, int] = defaultdict(int)
+    self._spec_pairs: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    self._labels: dict[str, str] = {}
+    self._product_facets: dict[str, list[tuple[str, str, str]]] = {}
+
+  def fresh(self) -> "ProductFacetIndex":
+    return ProductFacetIndex()
+
+  def rebuild(self, products: list[dict[str, Any]]) -> None:
+    self._reset()
+    for product in products:
+      self.upsert(product)
+
+  def upsert(self, product: dict[str, Any]) -> None:
+    product_id = product["id"]
+    self.remove(product_id)
+
+    ordinal = self._free.pop() if self._free else len(self._product_ids)
+    if ordinal == len(self._product_ids):
+      self._product_ids.append(product_id)
+    else:
+      self._product_ids[ordinal] = product_id
+    self._ordinals[product_id] = ordinal
+    bit = 1 << ordinal
+    self._all_bits |= bit
+
+    facets = []
+    for feature in product.get("product_features") or []:
+      value = normalize_facet(feature.get("feature"))
+      if value:
+        self._labels.setdefault(value, feature["feature"].strip())
+        facets.append(("feature", value, ""))
+    for spec in product.get("product_specs") or []:
+      key = normalize_facet(spec.get("spec_key"))
+      if not key:
+        continue
+      self._labels.setdefault(key, spec["spec_key"].strip())
+      value = normalize_facet(spec.get("spec_value"))
+      if value:
+        self._labels.setdefault(value, spec["spec_value"].strip())
+      facets.append(("spec", key, value))
+
+    for kind, key, value in facets:
+      if kind == "feature":
+        self._features[key] |= bit
+        continue
+      self._spec_keys[key] |= bit
+      if value:
+        self._spec_values[value] |= bit
+        self._spec_pairs[key][value] |= bit
+    self._product_facets[product_id] = facets
+
+  def remove(self, product_id: str) -> None:
+    ordinal = self._ordinals.pop(product_id, None)
+    if ordinal is None:
+      return
+    mask = ~(1 << ordinal)
+    self._all_bits &= mask
+    for kind, key, value in self._product_facets.pop(product_id, []):
+      if kind == "feature":
+        self._clear(self._features, key, mask)
+        continue
+      self._clear(self._spec_keys, key, mask)
+      if value:
+        self._clear(self._spec_values, value, mask)
+        self._clear(self._spec_pairs[key], value, mask)
+        if not self._spec_pairs[key]:
+          del self._spec_pairs[key]
+    self._product_ids[ordinal] = None
+    self._free.append(ordinal)
+
+  @staticmethod
+  def _clear(table: dict[str, int], key: str, mask: int) -> None:
+    if key not in table:
+      return
+    table[key] &= mask
+    if not table[key]:
+      del table[key]
+
+  @staticmethod
+  def _matching(table: dict[str, int], needle: str) -> int:
+    # Filters keep their substring semantics: every facet value containing
+    # the needle contributes its products.
+    normalized = normalize_facet(needle)
+    bits = 0
+    for value, value_bits in table.items():
+      if normalized in value:
+        bits |= value_bits
+    return bits
+
+  def filter_bits(
+    self,
+    feature: str | None,
+    spec_key: str | None,
+    spec_value: str | None,
+  ) -> int:
+    bits = self._all_bits
+    if feature:
+      bits &= self._matching(self._features, feature)
+    if spec_key:
+      bits &= self._matching(self._spec_keys, spec_key)
+    if spec_value:
+      bits &= self._matching(self._spec_values, spec_value)
+    return bits
+
+  def bits_for(self, product_ids: Iterable[str]) -> int:
+    bits = 0
+    for product_id in product_ids:
+      ordinal = self._ordinals.get(product_id)
+      if ordinal is not None:
+        bits |= 1 << ordinal
+    return bits
+
+  def contains(self, bits: int, product_id: str) -> bool:
+    ordinal = self._ordinals.get(product_id)
+    return ordinal is not None and bool(bits >> ordinal & 1)
+
+  def product_ids(self, bits: int) -> list[str]:
+    return [self._product_ids[ordinal] for ordinal in _bit_positions(bits)]
+
+  def _top(self, table: dict[str, int], bits: int, limit: int) -> list[dict[str, Any]]:
+    counted = [
+      (count, value)
+      for value, value_bits in table.items()
+      if (count := (value_bits & bits).bit_count())
+    ]
+    counted.sort(key=lambda item: (-item[0], item[1]))
+    return [
+      {"value": self._labels.get(value, value), "count": count}
+      for count, value in counted[:limit]
+    ]
+
+  def counts(self, bits: int, limit: int) -> dict[str, Any]:
+    specs = []
+    for key, key_bits in self._spec_keys.items():
+      count = (key_bits & bits).bit_count()
+      if count:
+        specs.append((count, key))
+    specs.sort(key=lambda item: (-item[0], item[1]))
+    return {
+      "features": self._top(self._features, bits, limit),
+      "specs": [
+        {
+          "key": self._labels.get(key, key),
+          "count": count,
+          "values": self._top(self._spec_pairs.get(key, {}), bits, limit),
+        }
+        for count, key in specs[:limit]
+      ],
+    }
@@ -0,0 +1,252 @@
+import csv
+import json
+import logging
+import os
+import threading
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, Iterator
+from xml.sax.saxutils import escape
+
+from lib.catalog_cache import env_float
+from lib.file_lock import file_lock
+
+logger = logging.getLogger("bafain.product_feeds")
+
+FEED_FIELDS = ("title", "description", "price_idr", "image_url", "created_at", "updated_at")
+# Sitemaps are limited to 50,000 URLs per file.
+SITEMAP_MAX_URLS = 50000
+STAMP_NAME = "feeds.json"
+PUBLIC_DIR = "public"
+CSV_COLUMNS = (
+  "id",
+  "title",
+  "description",
+  "link",
+  "image_link",
+  "price",
+  "availability",
+  "condition",
+)
+
+
+def product_feed_dir() -> str | None:
+  path = (os.getenv("PRODUCT_FEED_DIR") or "").strip()
+  return path or None
+
+
+def product_feed_public_dir() -> str | None:
+  root = product_feed_dir()
+  return os.path.join(root, PUBLIC_DIR) if root else None
+
+
+def product_site_url() -> str | None:
+  url = (os.getenv("PRODUCT_SITE_URL") or "").strip().rstrip("/")
+  return url or None
+
+
+def product_feed_url(site_url: str) -> str:
+  # Public URL of the `/feeds` mount, which sitemap indexes link into.
+  url = (os.getenv("PRODUCT_FEED_URL") or "").strip().rstrip("/")
+  return url or f"{site_url}/feeds"
+
+
+def feed_entry(product: dict[str, Any]) -> dict[str, Any]:
+  modified = product.get("updated_at") or product.get("created_at")
+  if isinstance(modified, datetime) and modified.tzinfo is None:
+    # Writes store naive UTC (datetime.utcnow); sitemaps need an offset.
+    modified = modified.replace(tzinfo=timezone.utc)
+  return {
+    "id": product["id"],
+    "title": product.get("title") or "",
+    "description": product.get("description") or "",
+    "price_idr": product.get("price_idr"),
+    "image_url": product.get("image_url"),
+    "lastmod": modified.isoformat() if isinstance(modified, datetime) else None,
+  }
+
+
+class _FeedWriter:
+  # Streams one product at a time into sitemap chunks, the CSV feed and the
+  # RSS feed, each written to a temporary file next to its final name.
+  def __init__(self, root: str, site_url: str, feed_url: str, stack: ExitStack) -> None:
+    self.root = root
+    self.site_url = site_url
+    self.feed_url = feed_url
+    self.stack = stack
+    self.temp_files: dict[str, str] = {}
+    self.sitemaps = 0
+    self.sitemap_urls = 0
+    self._sitemap = None
+    self._csv_handle = self._open("products.csv", newline="")
+    self._csv = csv.writer(self._csv_handle)
+    self._csv.writerow(CSV_COLUMNS)
+    self._xml = self._open("products.xml")
+    self._xml.write(
+      '<?xml version="1.0" encoding="UTF-8"?>\n'
+      '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0"><channel>'
+      f"<title>Bafain</title><link>{escape(site_url)}</link>"
+      "<description>Bafain products</description>\n"
+    )
+    self._sitemap_url(f"{site_url}/produk", None)
+
+  def _open(self, name: str, **kwargs):
+    path = os.path.join(self.root, f"{name}.{os.getpid()}.tmp")
+    self.temp_files[name] = path
+    return self.stack.enter_context(open(path, "w", encoding="utf-8", **kwargs))
+
+  def _sitemap_url(self, loc: str, lastmod: str | None) -> None:
+    if self._sitemap is None or self.sitemap_urls == SITEMAP_MAX_URLS:
+      if self._sitemap is not None:
+        self._sitemap.write("</urlset>\n")
+      self.sitemaps += 1
+      self.sitemap_urls = 0
+      self._sitemap = self._open(f"sitemap-{self.sitemaps}.xml")
+      self._sitemap.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+      )
+    modified = f"<lastmod>{lastmod}</lastmod>" if lastmod else ""
+    self._sitemap.write(f"<url><loc>{escape(loc)}</loc>{modified}</url>\n")
+    self.sitemap_urls += 1
+
+  def add(self, entry: dict[str, Any]) -> None:
+    link = f"{self.site_url}/produk/{entry['id']}"
+    self._sitemap_url(link, entry.get("lastmod"))
+    price = entry.get("price_idr")
+    if not isinstance(price, int):
+      # Merchant feeds reject items without a price.
+      return
+    image = entry.get("image_url") or ""
+    self._csv.writerow(
+      (
+        entry["id"],
+        entry["title"],
+        entry["description"],
+        link,
+        image,
+        f"{price} IDR",
+        "in_stock",
+        "new",
+      )
+    )
+    image_tag = f"<g:image_link>{escape(image)}</g:image_link>" if image else ""
+    self._xml.write(
+      f"<item><g:id>{escape(entry['id'])}</g:id><title>{escape(entry['title'])}</title>"
+      f"<description>{escape(entry['description'])}</description>"
+      f"<link>{escape(link)}</link>{image_tag}<g:price>{price} IDR</g:price>"
+      "<g:availability>in_stock</g:availability><g:condition>new</g:condition></item>\n"
+    )
+
+  def finish(self) -> dict[str, str]:
+    self._sitemap.write("</urlset>\n")
+    self._xml.write("</channel></rss>\n")
+    outputs = dict(self.temp_files)
+    if self.sitemaps == 1:
+      outputs["sitemap.xml"] = outputs.pop("sitemap-1.xml")
+    else:
+      index = self._open("sitemap.xml")
+      index.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+      )
+      for number in range(1, self.sitemaps + 1):
+        loc = escape(f"{self.feed_url}/sitemap-{number}.xml")
+        index.write(f"<sitemap><loc>{loc}</loc></sitemap>\n")
+      index.write("</sitemapindex>\n")
+      outputs["sitemap.xml"] = self.temp_files["sitemap.xml"]
+    return outputs
+
+
+class ProductFeeds:
+  # The public files are rebuilt from one streamed pass over the catalog.
+  # feeds.json records the catalog version they reflect, so a build is only
+  # repeated once a write has moved the catalog past it.
+  def __init__(self, delay_seconds: float = 5.0) -> None:
+    self.delay_seconds = delay_seconds
+    self._lock = threading.Lock()
+    self._timer: threading.Timer | None = None
+
+  def _stamp(self, root: str) -> int | None:
+    try:
+      with open(os.path.join(root, STAMP_NAME), encoding="utf-8") as handle:
+        return json.load(handle)["catalog_version"]
+    except (OSError, ValueError, KeyError, TypeError):
+      return None
+
+  def _write_stamp(self, root: str, catalog_version: int) -> None:
+    path = os.path.join(root, STAMP_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+      json.dump({"catalog_version": catalog_version}, handle)
+    os.replace(tmp_path, path)
+
+  def _write(self, root: str, site_url: str, entries: Iterable[dict]) -> int:
+    public_dir = os.path.join(root, PUBLIC_DIR)
+    os.makedirs(public_dir, exist_ok=True)
+    count = 0
+    with ExitStack() as stack:
+      writer = _FeedWriter(root, site_url, product_feed_url(site_url), stack)
+      for entry in entries:
+        writer.add(entry)
+        count += 1
+      outputs = writer.finish()
+    published = set(outputs)
+    for name, path in outputs.items():
+      os.replace(path, os.path.join(public_dir, name))
+    for name in os.listdir(public_dir):
+      if name.startswith("sitemap-") and name not in published:
+        os.remove(os.path.join(public_dir, name))
+    return count
+
+  def ensure(
+    self, loader: Callable[[], Iterable[dict]], catalog_version: int, force: bool = False
+  ) -> None:
+    # `catalog_version` must be read before calling, so the loaded products
+    # are at least that new. Feeds stamped behind it are rebuilt.
+    root = product_feed_dir()
+    site_url = product_site_url()
+    if not root:
+      return
+    if not site_url:
+      logger.warning("PRODUCT_SITE_URL is not set; product feeds are not generated.")
+      return
+    os.makedirs(root, exist_ok=True)
+    with file_lock(os.path.join(root, f"{STAMP_NAME}.lock")):
+      stamp = self._stamp(root)
+      if not force and stamp is not None and stamp >= catalog_version:
+        return
+      count = self._write(root, site_url, (feed_entry(product) for product in loader()))
+      self._write_stamp(root, catalog_version)
+    logger.info(
+      "Product feeds written with %s products at catalog version %s.", count, catalog_version
+    )
+
+  def schedule(
+    self, loader: Callable[[], Iterable[dict]], catalog_version: Callable[[], int]
+  ) -> None:
+    # Writes arriving while a rebuild is pending are covered by it, so a
+    # burst of edits costs one pass over the catalog, off the request thread.
+    if not product_feed_dir() or not product_site_url():
+      return
+    with self._lock:
+      if self._timer is not None:
+        return
+      self._timer = threading.Timer(self.delay_seconds, self._run, args=(loader, catalog_version))
+      self._timer.daemon = True
+      self._timer.start()
+
+  def _run(
+    self, loader: Callable[[], Iterable[dict]], catalog_version: Callable[[], int]
+  ) -> None:
+    with self._lock:
+      self._timer = None
+    try:
+      self.ensure(loader, catalog_version())
+    except Exception as exc:
+      logger.error("Product feed rebuild failed: %s", str(exc))
+
+
+product_feeds = ProductFeeds(
+  delay_seconds=env_float("PRODUCT_FEED_REBUILD_DELAY_SECONDS", 5.0)
+)
@@ -0,0 +1,148 @@
+import math
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any
+
+from lib.text_normalize import STOPWORDS, index_terms, stems, words
+from lib.trigram_index import TrigramIndex
+
+FIELD_WEIGHTS = {
+  "title": 3.0,
+  "features": 2.0,
+  "specs": 1.5,
+  "description": 1.0,
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_MATCH_WEIGHT = 0.5
+MIN_PREFIX_LENGTH = 3
+MAX_FUZZY_EXPANSIONS = 5
+
+
+def product_search_fields(product: dict[str, Any]) -> dict[str, str]:
+  features = product.get("product_features") or []
+  specs = product.get("product_specs") or []
+  return {
+    "title": product.get("title") or "",
+    "description": product.get("description") or "",
+    "features": " ".join(f.get("feature") or "" for f in features),
+    "specs": " ".join(
+      f"{s.get('spec_key') or ''} {s.get('spec_value') or ''}" for s in specs
+    ),
+  }
+
+
+class ProductSearchIndex:
+  def __init__(self, fuzzy_threshold: float = 0.3) -> None:
+    self.fuzzy_threshold = fuzzy_threshold
+    self._trigrams = TrigramIndex()
+    self._postings: dict[str, dict[str, float]] = defaultdict(dict)
+    self._doc_terms: dict[str, tuple[str, ...]] = {}
+    self._doc_lengths: dict[str, float] = {}
+    self._total_length = 0.0
+    self._vocabulary: list[str] | None = None
+
+  def fresh(self) -> "ProductSearchIndex":
+    return ProductSearchIndex(self.fuzzy_threshold)
+
+  def rebuild(self, products: list[dict[str, Any]]) -> None:
+    self._postings = defaultdict(dict)
+    self._doc_terms = {}
+    self._doc_lengths = {}
+    self._total_length = 0.0
+    self._vocabulary = None
+    self._trigrams.clear()
+    for product in products:
+      self.upsert(product)
+
+  def upsert(self, product: dict[str, Any]) -> None:
+    product_id = product["id"]
+    self.remove(product_id)
+
+    weighted: dict[str, float] = defaultdict(float)
+    length = 0.0
+    for field, text in product_search_fields(product).items():
+      weight = FIELD_WEIGHTS[field]
+      for term in index_terms(text):
+        weighted[term] += weight
+        length += weight
+
+    for term, frequency in weighted.items():
+      if term not in self._postings:
+        self._vocabulary = None
+        self._trigrams.add(term)
+      self._postings[term][product_id] = frequency
+    self._doc_terms[product_id] = tuple(weighted)
+    self._doc_lengths[product_id] = length
+    self._total_length += length
+
+  def remove(self, product_id: str) -> None:
+    terms = self._doc_terms.pop(product_id, None)
+    if terms is None:
+      return
+    for term in terms:
+      postings = self._postings[term]
+      postings.pop(product_id, None)
+      if not postings:
+        del self._postings[term]
+        self._vocabulary = None
+        self._trigrams.remove(term)
+    self._total_length -= self._doc_lengths.pop(product_id, 0.0)
+
+  def _expand(self, variants: tuple[str, ...]) -> list[tuple[str, float]]:
+    # `variants` are the possible stems of one query word, the first being
+    # its stem.
+    matches = []
+    for term in variants:
+      if term in self._postings:
+        matches.append((term, 1.0))
+      if len(term) >= MIN_PREFIX_LENGTH:
+        if self._vocabulary is None:
+          self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        index = bisect_left(vocabulary, term)
+        while index < len(vocabulary) and vocabulary[index].startswith(term):
+          if vocabulary[index] != term:
+            matches.append((vocabulary[index], PREFIX_MATCH_WEIGHT))
+          index += 1
+    if not matches and self.fuzzy_threshold > 0:
+      # Typo tolerance: only terms with no exact or prefix hit go through the
+      # trigram index, which is sized by vocabulary rather than catalog.
+      matches = self._trigrams.similar(variants[0], self.fuzzy_threshold, MAX_FUZZY_EXPANSIONS)
+    return matches
+
+  # Products must match every query term; returns None when the query has
+  # no indexable terms (e.g. only stopwords).
+  def search(self, query: str) -> dict[str, float] | None:
+    terms = list(dict.fromkeys(stems(word) for word in words(query) if word not in STOPWORDS))
+    if not terms:
+      return None
+    doc_count = len(self._doc_lengths)
+    if not doc_count:
+      return {}
+    average_length = (self._total_length / doc_count) or 1.0
+
+    scores: dict[str, float] | None = None
+    for variants in terms:
+      term_scores: dict[str, float] = {}
+      for indexed_term, match_weight in self._expand(variants):
+        postings = self._postings[indexed_term]
+        idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+        for product_id, frequency in postings.items():
+          length_norm = 1 - BM25_B + BM25_B * self._doc_lengths[product_id] / average_length
+          score = match_weight * idf * frequency * (BM25_K1 + 1) / (
+            frequency + BM25_K1 * length_norm
+          )
+          if score > term_scores.get(product_id, 0.0):
+            term_scores[product_id] = score
+      if scores is None:
+        scores = term_scores
+      else:
+        scores = {
+          product_id: scores[product_id] + score
+          for product_id, score in term_scores.items()
+          if product_id in scores
+        }
+      if not scores:
+        return {}
+    return scores
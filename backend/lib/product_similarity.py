@@ -0,0 +1,91 @@
+import math
+from typing import Any
+
+from lib.text_normalize import fold, tokenize
+
+try:
+  import numpy as np
+except ImportError:  # Only the related-products job needs numpy.
+  np = None
+
+# Price buckets are a quarter of an e-fold wide (about 28%); neighbouring
+# buckets get a half weight so close prices still overlap.
+PRICE_BUCKET_WIDTH = 0.25
+PRICE_NEIGHBOUR_WEIGHT = 0.5
+PRICE_WEIGHT = 1.0
+# Rows of the similarity matrix computed at once, bounding memory to
+# BLOCK_ROWS x products floats.
+BLOCK_ROWS = 512
+
+
+def numpy_available() -> bool:
+  return np is not None
+
+
+def product_terms(product: dict[str, Any]) -> dict[str, float]:
+  terms: dict[str, float] = {}
+  for feature in product.get("product_features") or []:
+    for token in tokenize(feature.get("feature")):
+      terms[f"f:{token}"] = 1.0
+  for spec in product.get("product_specs") or []:
+    key = " ".join(fold(spec.get("spec_key") or "").split())
+    if not key:
+      continue
+    terms[f"k:{key}"] = 1.0
+    value = " ".join(fold(spec.get("spec_value") or "").split())
+    if value:
+      terms[f"s:{key}={value}"] = 1.0
+  price = product.get("price_idr")
+  if isinstance(price, int) and price > 0:
+    bucket = math.floor(math.log(price) / PRICE_BUCKET_WIDTH)
+    terms[f"p:{bucket}"] = PRICE_WEIGHT
+    terms[f"p:{bucket - 1}"] = PRICE_WEIGHT * PRICE_NEIGHBOUR_WEIGHT
+    terms[f"p:{bucket + 1}"] = PRICE_WEIGHT * PRICE_NEIGHBOUR_WEIGHT
+  return terms
+
+
+def feature_matrix(products: list[dict[str, Any]]):
+  # Rows are products, columns are terms shared by at least two products
+  # (a term only one product has cannot make two products similar, but it
+  # still counts towards that product's norm). Weights are IDF-scaled and
+  # rows L2-normalized, so X @ X.T is cosine similarity.
+  rows = [product_terms(product) for product in products]
+  counts: dict[str, int] = {}
+  for terms in rows:
+    for term in terms:
+      counts[term] = counts.get(term, 0) + 1
+  columns = {term: index for index, term in enumerate(t for t, n in counts.items() if n > 1)}
+  idf = {term: math.log(len(products) / count) + 1.0 for term, count in counts.items()}
+
+  matrix = np.zeros((len(products), len(columns)), dtype=np.float32)
+  unique_norms = np.zeros((len(products), 1), dtype=np.float32)
+  for row, terms in enumerate(rows):
+    for term, weight in terms.items():
+      column = columns.get(term)
+      if column is None:
+        unique_norms[row, 0] += (weight * idf[term]) ** 2
+      else:
+        matrix[row, column] = weight * idf[term]
+  norms = np.sqrt(np.sum(matrix * matrix, axis=1, keepdims=True) + unique_norms)
+  np.divide(matrix, norms, out=matrix, where=norms > 0)
+  return matrix
+
+
+def top_k_similar(matrix, k: int) -> list[list[tuple[int, float]]]:
+  count = matrix.shape[0]
+  k = min(k, count - 1)
+  results: list[list[tuple[int, float]]] = []
+  if k <= 0:
+    return [[] for _ in range(count)]
+  for start in range(0, count, BLOCK_ROWS):
+    block = matrix[start : start + BLOCK_ROWS] @ matrix.T
+    rows = np.arange(block.shape[0])
+    block[rows, rows + start] = -1.0
+    candidates = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    for row, columns in enumerate(candidates):
+      scores = block[row, columns]
+      order = np.argsort(-scores, kind="stable")
+      results.append(
+        [(int(columns[i]), float(scores[i])) for i in order if scores[i] > 0]
+      )
+  return results
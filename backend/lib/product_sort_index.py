@@ -0,0 +1,80 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Any, Iterator
+
+SORT_FIELDS = ("price_idr", "created_at", "sold_count")
+
+
+def sort_key_value(field: str, value: Any) -> Any:
+  if isinstance(value, datetime):
+    return value.timestamp()
+  if field == "sold_count" and value is None:
+    return 0
+  return value
+
+
+class ProductSortIndex:
+  # One ascending array of (key, product_id) per sortable field. Products
+  # without a value for a field are left out of that array, matching
+  # Firestore's order_by semantics (sold_count defaults to 0).
+  def __init__(self) -> None:
+    self._keys: dict[str, dict[str, Any]] = {field: {} for field in SORT_FIELDS}
+    self._sorted: dict[str, list[tuple[Any, str]]] = {field: [] for field in SORT_FIELDS}
+
+  def fresh(self) -> "ProductSortIndex":
+    return ProductSortIndex()
+
+  def rebuild(self, products: list[dict[str, Any]]) -> None:
+    for field in SORT_FIELDS:
+      keys = {}
+      for product in products:
+        key = sort_key_value(field, product.get(field))
+        if key is not None:
+          keys[product["id"]] = key
+      self._keys[field] = keys
+      self._sorted[field] = sorted((key, product_id) for product_id, key in keys.items())
+
+  def upsert(self, product: dict[str, Any]) -> None:
+    self.remove(product["id"])
+    for field in SORT_FIELDS:
+      key = sort_key_value(field, product.get(field))
+      if key is None:
+        continue
+      self._keys[field][product["id"]] = key
+      insort(self._sorted[field], (key, product["id"]))
+
+  def remove(self, product_id: str) -> None:
+    for field in SORT_FIELDS:
+      key = self._keys[field].pop(product_id, None)
+      if key is None:
+        continue
+      entries = self._sorted[field]
+      index = bisect_left(entries, (key, product_id))
+      if index < len(entries) and entries[index] == (key, product_id):
+        del entries[index]
+
+  def scan(
+    self,
+    field: str,
+    descending: bool,
+    min_price: int | None = None,
+    max_price: int | None = None,
+    after: tuple[Any, str] | None = None,
+  ) -> Iterator[str]:
+    entries = self._sorted[field]
+    low, high = 0, len(entries)
+    if field == "price_idr":
+      # Price ranges are located by bisection, so a filtered page costs
+      # O(log n + k) instead of a walk over the catalog.
+      if min_price is not None:
+        low = bisect_left(entries, (min_price, ""))
+      if max_price is not None:
+        high = bisect_right(entries, (max_price, "\uffff"))
+    if after is not None:
+      if descending:
+        high = bisect_left(entries, after, low, high)
+      else:
+        low = bisect_right(entries, after, low, high)
+    positions = range(high - 1, low - 1, -1) if descending else range(low, high)
+    for position in positions:
+      yield entries[position][1]
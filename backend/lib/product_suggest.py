@@ -0,0 +1,118 @@
+import heapq
+from bisect import bisect_left
+from collections import Counter
+from typing import Any
+
+from lib.text_normalize import STOPWORDS, words
+
+MIN_TERM_LENGTH = 3
+MAX_MEMOIZED_PREFIXES = 2048
+
+
+class ProductSuggestIndex:
+  def __init__(self) -> None:
+    self._titles: dict[str, list[str]] = {}
+    self._product_terms: dict[str, set[str]] = {}
+    self._term_counts: Counter[str] = Counter()
+    self._title_keys: list[tuple[str, str]] | None = None
+    self._term_keys: list[str] | None = None
+    self._memo: dict[tuple[str, int], tuple[list[str], list[str]]] = {}
+
+  def fresh(self) -> "ProductSuggestIndex":
+    return ProductSuggestIndex()
+
+  def rebuild(self, products: list[dict[str, Any]]) -> None:
+    self._titles = {}
+    self._product_terms = {}
+    self._term_counts = Counter()
+    self._title_keys = None
+    self._term_keys = None
+    self._memo = {}
+    for product in products:
+      self.upsert(product)
+
+  def upsert(self, product: dict[str, Any]) -> None:
+    product_id = product["id"]
+    self.remove(product_id)
+
+    title_words = words(product.get("title"))
+    # Every word start in the title is a key, so "cuci" completes to
+    # "Mesin Cuci Sharp" as well as "mesin" does.
+    self._titles[product_id] = [
+      " ".join(title_words[start:]) for start in range(len(title_words))
+    ]
+
+    feature_words = [
+      word
+      for feature in product.get("product_features") or []
+      for word in words(feature.get("feature"))
+    ]
+    terms = {
+      word
+      for word in title_words + feature_words
+      if len(word) >= MIN_TERM_LENGTH and word not in STOPWORDS and not word.isdigit()
+    }
+    self._product_terms[product_id] = terms
+    self._term_counts.update(terms)
+    self._title_keys = None
+    self._term_keys = None
+    self._memo.clear()
+
+  def remove(self, product_id: str) -> None:
+    if self._titles.pop(product_id, None) is None:
+      return
+    terms = self._product_terms.pop(product_id, set())
+    self._term_counts.subtract(terms)
+    for term in terms:
+      if self._term_counts[term] <= 0:
+        del self._term_counts[term]
+    self._title_keys = None
+    self._term_keys = None
+    self._memo.clear()
+
+  def _sorted_keys(self) -> tuple[list[tuple[str, str]], list[str]]:
+    if self._title_keys is None:
+      self._title_keys = sorted(
+        (key, product_id)
+        for product_id, keys in self._titles.items()
+        for key in keys
+      )
+    if self._term_keys is None:
+      self._term_keys = sorted(self._term_counts)
+    return self._title_keys, self._term_keys
+
+  def suggest(self, prefix: str, limit: int) -> tuple[list[str], list[str]]:
+    normalized = " ".join(words(prefix))
+    if not normalized:
+      return [], []
+    # Short prefixes span large key ranges; keystroke traffic repeats them,
+    # so results are memoized until the catalog changes.
+    memo_key = (normalized, limit)
+    if memo_key in self._memo:
+      return self._memo[memo_key]
+    title_keys, term_keys = self._sorted_keys()
+
+    index = bisect_left(term_keys, normalized)
+    term_matches = []
+    while index < len(term_keys) and term_keys[index].startswith(normalized):
+      term_matches.append(term_keys[index])
+      index += 1
+    terms = heapq.nsmallest(
+      limit, term_matches, key=lambda term: (-self._term_counts[term], term)
+    )
+
+    index = bisect_left(title_keys, (normalized, ""))
+    ranked: dict[str, tuple[int, str]] = {}
+    while index < len(title_keys) and title_keys[index][0].startswith(normalized):
+      key, product_id = title_keys[index]
+      # Titles that start with the prefix rank ahead of mid-title matches.
+      rank = (0 if key == self._titles[product_id][0] else 1, key)
+      if product_id not in ranked or rank < ranked[product_id]:
+        ranked[product_id] = rank
+      index += 1
+    products = heapq.nsmallest(limit, ranked, key=lambda product_id: ranked[product_id])
+
+    if len(self._memo) >= MAX_MEMOIZED_PREFIXES:
+      self._memo.clear()
+    self._memo[memo_key] = (terms, products)
+    return terms, products
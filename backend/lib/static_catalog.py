@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from lib.catalog_cache import env_float
+from lib.file_lock import file_lock
+
+logger = logging.getLogger("bafain.static_catalog")
+
+MANIFEST_NAME = "manifest.json"
+# Shards are named `<logical name>.<hash>.json`; only files with this shape
+# are ever pruned from the directory.
+_SHARD_NAME = re.compile(r"^.+\.[0-9a-f]{16}\.json$")
+
+
+def static_catalog_dir() -> str | None:
+  path = (os.getenv("PRODUCT_STATIC_CATALOG_DIR") or "").strip()
+  return path or None
+
+
+def static_catalog_auto_publish() -> bool:
+  raw = (os.getenv("PRODUCT_STATIC_CATALOG_AUTO_PUBLISH") or "").strip().lower()
+  return raw in {"1", "true", "yes"}
+
+
+def shard_path(name: str, body: bytes) -> str:
+  return f"{name}.{hashlib.sha256(body).hexdigest()[:16]}.json"
+
+
+def _write_atomic(path: str, body: bytes) -> None:
+  tmp_path = f"{path}.{os.getpid()}.tmp"
+  with open(tmp_path, "wb") as handle:
+    handle.write(body)
+    handle.flush()
+    os.fsync(handle.fileno())
+  os.replace(tmp_path, path)
+
+
+def _read_manifest(root: str) -> dict[str, Any]:
+  try:
+    with open(os.path.join(root, MANIFEST_NAME), "rb") as handle:
+      return json.load(handle)
+  except (FileNotFoundError, ValueError):
+    return {}
+
+
+class StaticCatalogPublisher:
+  # Writes content-addressed shards and then swaps the manifest, so a reader
+  # holding any recent manifest only ever sees complete files. Shards from
+  # the previous manifest are kept for one more publish for such readers.
+  def __init__(self, delay_seconds: float) -> None:
+    self.delay_seconds = delay_seconds
+    self._timer: threading.Timer | None = None
+    self._lock = threading.Lock()
+
+  def manifest(self, root: str) -> dict[str, Any]:
+    return _read_manifest(root)
+
+  def read_shard(self, root: str, manifest: dict[str, Any], name: str) -> Any:
+    path = (manifest.get("shards") or {}).get(name)
+    if not path:
+      return None
+    try:
+      with open(os.path.join(root, path), "rb") as handle:
+        return json.load(handle)
+    except (FileNotFoundError, ValueError):
+      return None
+
+  def publish(
+    self,
+    root: str,
+    shards: dict[str, bytes],
+    kept: dict[str, str] | None = None,
+    **manifest: Any,
+  ) -> dict[str, Any]:
+    # `kept` maps shard names to paths already on disk that stay published
+    # without being rendered again.
+    os.makedirs(root, exist_ok=True)
+    with file_lock(os.path.join(root, f"{MANIFEST_NAME}.lock")):
+      previous = _read_manifest(root).get("shards") or {}
+      paths = dict(kept or {})
+      written = 0
+      for name, body in shards.items():
+        path = shard_path(name, body)
+        full_path = os.path.join(root, path)
+        if not os.path.exists(full_path):
+          os.makedirs(os.path.dirname(full_path), exist_ok=True)
+          _write_atomic(full_path, body)
+          written += 1
+        paths[name] = path
+
+      document = {
+        **manifest,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "shards": paths,
+      }
+      _write_atomic(
+        os.path.join(root, MANIFEST_NAME),
+        json.dumps(document, separators=(",", ":")).encode("utf-8"),
+      )
+      removed = self._prune(root, set(paths.values()) | set(previous.values()))
+
+    logger.info(
+      "Static catalog published: %s shards, %s written, %s removed.",
+      len(paths),
+      written,
+      removed,
+    )
+    return {
+      "shards": len(paths),
+      "written": written,
+      "unchanged": len(paths) - written,
+      "removed": removed,
+    }
+
+  def _prune(self, root: str, keep: set[str]) -> int:
+    removed = 0
+    for directory, _dirs, files in os.walk(root):
+      for name in files:
+        if not _SHARD_NAME.match(name):
+          continue
+        full_path = os.path.join(directory, name)
+        if os.path.relpath(full_path, root) not in keep:
+          os.remove(full_path)
+          removed += 1
+    return removed
+
+  def schedule(self, job: Callable[[], Any]) -> None:
+    # Writes arriving while a run is pending are covered by that run, so a
+    # burst of edits costs one publish.
+    with self._lock:
+      if self._timer is not None:
+        return
+      self._timer = threading.Timer(self.delay_seconds, self._run, args=(job,))
+      self._timer.daemon = True
+      self._timer.start()
+
+  def _run(self, job: Callable[[], Any]) -> None:
+    with self._lock:
+      self._timer = None
+    try:
+      job()
+    except Exception as exc:
+      logger.error("Static catalog publish failed: %s", str(exc))
+
+
+static_catalog = StaticCatalogPublisher(
+  delay_seconds=env_float("PRODUCT_STATIC_CATALOG_PUBLISH_DELAY_SECONDS", 2.0)
+)
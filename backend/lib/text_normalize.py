@@ -0,0 +1,101 @@
+import re
+import unicodedata
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+STOPWORDS = frozenset({
+  "ada", "adalah", "agar", "akan", "atau", "bagi", "bahwa", "bisa", "dalam",
+  "dan", "dari", "dengan", "di", "hingga", "ini", "itu", "juga", "ke", "karena",
+  "kami", "lebih", "oleh", "pada", "para", "sangat", "saja", "sebagai", "serta",
+  "sudah", "tanpa", "tidak", "untuk", "yang",
+  "a", "an", "and", "for", "in", "of", "on", "or", "the", "to", "with",
+})
+
+_PARTICLES = ("lah", "kah", "tah", "pun")
+_POSSESSIVES = ("nya", "ku", "mu")
+# "-i" is left alone: too many roots end in it (beli, cuci, kunci).
+_SUFFIXES = ("kan", "an")
+_VOWELS = frozenset("aeiou")
+# Longest first; only the first prefix the word starts with is considered.
+_PREFIXES = (
+  "meng", "meny", "mem", "men", "me",
+  "peng", "peny", "pem", "pen", "pe",
+  "ber", "ter", "di", "ke", "se",
+)
+# meN-/peN- drop or merge the root's first consonant (nasal assimilation).
+# Each entry maps the letter after the prefix to the possible roots: "" keeps
+# it, a letter replaces the dropped consonant. The first root is the stem;
+# the others are indexed as well, since without a dictionary "memasak"
+# (masak) and "memakai" (pakai) cannot be told apart.
+_NASAL_ROOTS = {
+  "ng": ({ch: ("", "k") for ch in _VOWELS}, {ch: ("",) for ch in "ghk"}),
+  "ny": ({ch: ("s",) for ch in _VOWELS}, {}),
+  "m": ({ch: ("p", "m") for ch in _VOWELS}, {ch: ("",) for ch in "bfpv"}),
+  "n": ({ch: ("t", "n") for ch in _VOWELS}, {ch: ("",) for ch in "cdjsz"}),
+  "": ({}, {ch: ("",) for ch in "lrwy"}),
+}
+_MIN_STEM = 4
+
+
+def fold(text: str) -> str:
+  decomposed = unicodedata.normalize("NFKD", text.casefold())
+  return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _strip_suffix(word: str, suffixes: tuple[str, ...]) -> str:
+  for suffix in suffixes:
+    if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+      return word[: -len(suffix)]
+  return word
+
+
+def _roots(word: str) -> tuple[str, ...]:
+  for prefix in _PREFIXES:
+    if not word.startswith(prefix):
+      continue
+    rest = word[len(prefix):]
+    if prefix[:2] in ("me", "pe"):
+      vowel_roots, consonant_roots = _NASAL_ROOTS[prefix[2:]]
+      heads = vowel_roots.get(rest[:1]) or consonant_roots.get(rest[:1])
+      if heads is None:
+        # Not a meN-/peN- form (mesin, pedas, mentega).
+        return (word,)
+      roots = tuple(head + rest for head in heads)
+    else:
+      roots = (rest,)
+    if len(roots[0]) < _MIN_STEM:
+      return (word,)
+    return roots
+  return (word,)
+
+
+def stems(word: str) -> tuple[str, ...]:
+  # Light Indonesian stemmer: particles, possessives, one derivational
+  # suffix and one prefix, never cutting below _MIN_STEM characters. The
+  # first entry is the stem; ambiguous nasal prefixes add alternatives.
+  if word.isdigit():
+    return (word,)
+  word = _strip_suffix(word, _PARTICLES)
+  word = _strip_suffix(word, _POSSESSIVES)
+  word = _strip_suffix(word, _SUFFIXES)
+  return _roots(word)
+
+
+def stem(word: str) -> str:
+  return stems(word)[0]
+
+
+def words(text: str | None) -> list[str]:
+  if not text:
+    return []
+  return _TOKEN_RE.findall(fold(text))
+
+
+def tokenize(text: str | None) -> list[str]:
+  return [stem(token) for token in words(text) if token not in STOPWORDS]
+
+
+def index_terms(text: str | None) -> list[str]:
+  # Like tokenize, plus the alternative roots of ambiguous words, so a
+  # document matches a query for any of them.
+  return [term for token in words(text) if token not in STOPWORDS for term in stems(token)]
@@ -0,0 +1,50 @@
+from collections import Counter, defaultdict
+
+
+def trigrams(term: str) -> set[str]:
+  padded = f"  {term} "
+  return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+  def __init__(self) -> None:
+    self._postings: dict[str, set[str]] = defaultdict(set)
+    self._sizes: dict[str, int] = {}
+
+  def clear(self) -> None:
+    self._postings = defaultdict(set)
+    self._sizes = {}
+
+  def add(self, term: str) -> None:
+    if term in self._sizes:
+      return
+    grams = trigrams(term)
+    self._sizes[term] = len(grams)
+    for gram in grams:
+      self._postings[gram].add(term)
+
+  def remove(self, term: str) -> None:
+    if self._sizes.pop(term, None) is None:
+      return
+    for gram in trigrams(term):
+      terms = self._postings.get(gram)
+      if terms is None:
+        continue
+      terms.discard(term)
+      if not terms:
+        del self._postings[gram]
+
+  # Jaccard similarity over padded trigrams, as in PostgreSQL pg_trgm.
+  def similar(self, term: str, threshold: float, limit: int) -> list[tuple[str, float]]:
+    grams = trigrams(term)
+    shared: Counter[str] = Counter()
+    for gram in grams:
+      shared.update(self._postings.get(gram, ()))
+
+    matches = []
+    for candidate, overlap in shared.items():
+      similarity = overlap / (len(grams) + self._sizes[candidate] - overlap)
+      if similarity >= threshold:
+        matches.append((candidate, similarity))
+    matches.sort(key=lambda match: (-match[1], match[0]))
+    return matches[:limit]
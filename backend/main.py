@@ -1,11 +1,20 @@
+import logging
 import os
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+from controllers.product_controller import ensure_catalog_snapshot, ensure_product_feeds
+from lib.catalog_mirror import catalog_mirror, catalog_mirror_enabled
+from lib.catalog_snapshot import catalog_snapshot_path
+from lib.product_feeds import product_feed_dir, product_feed_public_dir
+from lib.firestore_client import get_firestore_client
+
 from routes.auth import router as auth_router
 from routes.addresses import router as addresses_router
 from routes.admin_products import router as admin_products_router
@@ -27,8 +36,33 @@ load_dotenv()
 app_env = (os.getenv("APP_ENV") or "").strip().lower()
 is_production = app_env in {"production", "prod"}
 
+logger = logging.getLogger("bafain.main")
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+  if catalog_mirror_enabled():
+    try:
+      catalog_mirror.start(get_firestore_client())
+    except Exception as exc:
+      logger.error("Catalog mirror failed to start: %s", str(exc))
+  if catalog_snapshot_path():
+    try:
+      ensure_catalog_snapshot(get_firestore_client())
+    except Exception as exc:
+      logger.error("Catalog snapshot could not be prepared: %s", str(exc))
+  if product_feed_dir():
+    try:
+      ensure_product_feeds(get_firestore_client())
+    except Exception as exc:
+      logger.error("Product feeds could not be prepared: %s", str(exc))
+  yield
+  catalog_mirror.stop()
+
+
 app = FastAPI(
   title="Bafain API",
+  lifespan=lifespan,
   docs_url=None if is_production else "/docs",
   redoc_url=None if is_production else "/redoc",
   openapi_url=None if is_production else "/openapi.json",
@@ -53,6 +87,7 @@ app.add_middleware(
   allow_credentials=True,
   allow_methods=["*"],
   allow_headers=["*"],
+  expose_headers=["X-Next-Cursor", "Deprecation", "ETag"],
 )
 
 
@@ -112,6 +147,12 @@ app.include_router(shipment_router, tags=["shipment"])
 app.include_router(shipping_router, tags=["shipping"])
 app.include_router(uploads_router, prefix="/uploads", tags=["uploads"])
 
+feed_public_dir = product_feed_public_dir()
+if feed_public_dir:
+  # StaticFiles answers with Last-Modified/ETag and honours If-Modified-Since.
+  os.makedirs(feed_public_dir, exist_ok=True)
+  app.mount("/feeds", StaticFiles(directory=feed_public_dir), name="feeds")
+
 
 if __name__ == "__main__":
   import uvicorn
@@ -1,20 +1,28 @@
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, Any, Literal, Optional
 
 from pydantic import BaseModel, Field
 
 
+ProductSort = Literal["relevance", "newest", "price_asc", "price_desc", "popularity"]
+# A single document id; slashes would address nested documents.
+ProductId = Annotated[str, Field(min_length=1, max_length=100, pattern=r"^[A-Za-z0-9_-]+$")]
+
+
 class ProductImageInput(BaseModel):
+  id: Optional[ProductId] = None
   image_url: str = Field(min_length=1, max_length=2000)
   sort_order: int = 0
 
 
 class ProductFeatureInput(BaseModel):
+  id: Optional[ProductId] = None
   feature: str = Field(min_length=1, max_length=1000)
   sort_order: int = 0
 
 
 class ProductSpecInput(BaseModel):
+  id: Optional[ProductId] = None
   spec_key: str = Field(min_length=1, max_length=200)
   spec_value: Optional[str] = None
   spec_qty: Optional[int] = Field(default=None, ge=0)
@@ -23,12 +31,14 @@ class ProductSpecInput(BaseModel):
 
 
 class ProductBenefitInput(BaseModel):
+  id: Optional[ProductId] = None
   title: str = Field(min_length=1, max_length=300)
   description: Optional[str] = None
   sort_order: int = 0
 
 
 class ProductGalleryInput(BaseModel):
+  id: Optional[ProductId] = None
   title: str = Field(min_length=1, max_length=300)
   description: Optional[str] = None
   image_url: str = Field(min_length=1, max_length=2000)
@@ -48,6 +58,10 @@ class ProductCreateRequest(BaseModel):
   gallery: list[ProductGalleryInput] = []
 
 
+class ProductImportRow(ProductCreateRequest):
+  id: Optional[ProductId] = None
+
+
 class ProductUpdateRequest(BaseModel):
   title: Optional[str] = Field(default=None, min_length=1, max_length=300)
   price_idr: Optional[int] = Field(default=None, ge=0)
@@ -111,8 +125,175 @@ class ProductResponse(BaseModel):
   description: Optional[str] = None
   image_url: Optional[str] = None
   created_at: Optional[datetime] = None
+  updated_at: Optional[datetime] = None
+  sold_count: int = 0
   product_images: list[ProductImage] = []
   product_features: list[ProductFeature] = []
   product_specs: list[ProductSpec] = []
   product_benefits: list[ProductBenefit] = []
   product_gallery: list[ProductGallery] = []
+
+
+class FacetValueCount(BaseModel):
+  value: str
+  count: int
+
+
+class SpecFacet(BaseModel):
+  key: str
+  count: int
+  values: list[FacetValueCount] = []
+
+
+class ProductFacets(BaseModel):
+  features: list[FacetValueCount] = []
+  specs: list[SpecFacet] = []
+
+
+class ProductSearchResponse(BaseModel):
+  items: list[ProductResponse]
+  next_cursor: Optional[str] = None
+  total: int
+  facets: ProductFacets
+
+
+class ProductSuggestion(BaseModel):
+  id: str
+  title: str
+  price_idr: int
+  image_url: Optional[str] = None
+
+
+class ProductSuggestResponse(BaseModel):
+  prefix: str
+  terms: list[str]
+  products: list[ProductSuggestion]
+
+
+class CatalogCacheStats(BaseModel):
+  name: str
+  size: int
+  max_entries: int
+  ttl_seconds: float
+  hits: int
+  misses: int
+  hit_ratio: float
+
+
+class CatalogMirrorStats(BaseModel):
+  enabled: bool
+  ready: bool
+  products: int
+  version: int
+
+
+class CatalogCacheStatsResponse(BaseModel):
+  caches: list[CatalogCacheStats]
+  mirror: CatalogMirrorStats
+
+
+class ProductChangesResponse(BaseModel):
+  since: int
+  next_since: int
+  has_more: bool
+  products: list[ProductResponse] = []
+  deleted: list[str] = []
+
+
+class ProductBatchGetRequest(BaseModel):
+  ids: list[ProductId] = Field(min_length=1, max_length=300)
+
+
+class ProductBatchGetItem(BaseModel):
+  id: str
+  found: bool
+  product: Optional[ProductResponse] = None
+
+
+class ProductBatchGetResponse(BaseModel):
+  items: list[ProductBatchGetItem]
+
+
+class ProductBulkDeleteRequest(BaseModel):
+  ids: list[ProductId] = Field(min_length=1, max_length=1000)
+
+
+class ProductBulkDeleteResponse(BaseModel):
+  deleted: list[str]
+  not_found: list[str]
+  child_documents: int
+  failed_child_documents: int
+
+
+class ProductImportError(BaseModel):
+  line: int
+  error: Any
+
+
+class ProductImportResponse(BaseModel):
+  created: int
+  failed: int
+  product_ids: list[str]
+  errors: list[ProductImportError]
+
+
+class ProductRepriceFilter(BaseModel):
+  q: Optional[str] = None
+  min_price: Optional[int] = Field(default=None, ge=0)
+  max_price: Optional[int] = Field(default=None, ge=0)
+  feature: Optional[str] = None
+  spec_key: Optional[str] = None
+  spec_value: Optional[str] = None
+
+
+class ProductRepriceRule(BaseModel):
+  percent: Optional[float] = Field(default=None, ge=-100, le=1000)
+  absolute: Optional[int] = None
+  round_to: Optional[int] = Field(default=None, ge=1)
+
+
+class ProductRepriceRequest(BaseModel):
+  filter: ProductRepriceFilter = ProductRepriceFilter()
+  rule: ProductRepriceRule
+  dry_run: bool = True
+
+
+class ProductPriceChange(BaseModel):
+  id: str
+  title: str
+  old_price_idr: int
+  new_price_idr: int
+
+
+class ProductRepriceResponse(BaseModel):
+  dry_run: bool
+  matched: int
+  changed: int
+  chunks: int
+  changes: list[ProductPriceChange]
+
+
+class StaticCatalogPublishResponse(BaseModel):
+  version: int
+  products: int
+  pages: int
+  rendered: int
+  shards: int
+  written: int
+  unchanged: int
+  removed: int
+
+
+class RelatedProduct(BaseModel):
+  id: str
+  title: str
+  price_idr: int
+  price_unit: Optional[str] = None
+  image_url: Optional[str] = None
+  score: float
+
+
+class ProductRelatedResponse(BaseModel):
+  product_id: str
+  generated_at: Optional[datetime] = None
+  items: list[RelatedProduct] = []
@@ -1,36 +1,66 @@
-from fastapi import APIRouter, Depends, Header, Query
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from controllers.product_controller import (
+  IMPORT_CHUNK_SIZE,
   create_product,
   delete_product,
+  delete_products,
+  export_products,
+  get_catalog_cache_stats,
   get_product,
+  import_products,
   list_products,
+  publish_static_catalog,
+  reprice_products,
+  resolve_fieldset,
   update_product,
 )
 from lib.admin_access import ADMIN_PRODUCT_WRITE_ROLES, ADMIN_READ_ROLES, require_admin_access
 from lib.firebase_auth import extract_access_token
 from lib.firestore_client import get_firestore_client
-from models.product import ProductCreateRequest, ProductResponse, ProductUpdateRequest
+from lib.pagination import apply_pagination_headers
+from models.product import (
+  CatalogCacheStatsResponse,
+  ProductBulkDeleteRequest,
+  ProductBulkDeleteResponse,
+  ProductCreateRequest,
+  ProductImportResponse,
+  ProductRepriceRequest,
+  ProductRepriceResponse,
+  ProductResponse,
+  ProductSort,
+  ProductUpdateRequest,
+  StaticCatalogPublishResponse,
+)
 
 router = APIRouter(prefix="/api/v1/admin/products")
 
 
 @router.get("", response_model=list[ProductResponse])
 def admin_list_products_route(
+  response: Response,
   firestore=Depends(get_firestore_client),
   limit: int = Query(50, ge=1, le=200),
   offset: int = Query(0, ge=0),
+  cursor: str | None = None,
   q: str | None = None,
   min_price: int | None = Query(default=None, ge=0),
   max_price: int | None = Query(default=None, ge=0),
   feature: str | None = None,
   spec_key: str | None = None,
   spec_value: str | None = None,
+  sort: ProductSort | None = None,
+  fields: str | None = None,
+  include: str | None = None,
   authorization: str | None = Header(default=None),
 ):
   access_token = extract_access_token(authorization)
   require_admin_access(access_token, firestore, ADMIN_READ_ROLES)
-  return list_products(
+  fieldset = resolve_fieldset(fields, include)
+  result = list_products(
     firestore,
     limit,
     offset,
@@ -40,9 +70,144 @@ def admin_list_products_route(
     feature=feature,
     spec_key=spec_key,
     spec_value=spec_value,
+    cursor=cursor,
+    sort=sort,
+    fieldset=fieldset,
+  )
+  if fieldset is not None:
+    # Sparse items would fail response_model validation, so they bypass it.
+    sparse = JSONResponse(jsonable_encoder(result["items"]))
+    apply_pagination_headers(sparse, result["next_cursor"], offset, cursor)
+    return sparse
+  apply_pagination_headers(response, result["next_cursor"], offset, cursor)
+  return result["items"]
+
+
+@router.get("/cache-stats", response_model=CatalogCacheStatsResponse)
+def admin_catalog_cache_stats_route(
+  authorization: str | None = Header(default=None),
+  firestore=Depends(get_firestore_client),
+):
+  access_token = extract_access_token(authorization)
+  require_admin_access(access_token, firestore, ADMIN_READ_ROLES)
+  return get_catalog_cache_stats()
+
+
+@router.post(":bulkDelete", response_model=ProductBulkDeleteResponse)
+def admin_bulk_delete_products_route(
+  payload: ProductBulkDeleteRequest,
+  authorization: str | None = Header(default=None),
+  firestore=Depends(get_firestore_client),
+):
+  access_token = extract_access_token(authorization)
+  require_admin_access(access_token, firestore, ADMIN_PRODUCT_WRITE_ROLES)
+  return delete_products(firestore, payload.ids)
+
+
+@router.get(":export")
+def admin_export_products_route(
+  authorization: str | None = Header(default=None),
+  firestore=Depends(get_firestore_client),
+):
+  access_token = extract_access_token(authorization)
+  require_admin_access(access_token, firestore, ADMIN_READ_ROLES)
+  return StreamingResponse(
+    export_products(firestore),
+    media_type="application/x-ndjson",
+    headers={"Content-Disposition": 'attachment; filename="products.ndjson"'},
   )
 
 
+@router.post(":import", response_model=ProductImportResponse)
+async def admin_import_products_route(
+  request: Request,
+  authorization: str | None = Header(default=None),
+  firestore=Depends(get_firestore_client),
+):
+  access_token = extract_access_token(authorization)
+  await run_in_threadpool(
+    require_admin_access, access_token, firestore, ADMIN_PRODUCT_WRITE_ROLES
+  )
+
+  # The body is consumed as a stream and imported chunk by chunk, so only
+  # one chunk of rows is held in memory.
+  product_ids: list[str] = []
+  errors: list[dict] = []
+  chunk: list[tuple[int, str]] = []
+  buffer = b""
+  line_number = 0
+
+  async def flush() -> None:
+    if chunk:
+      result = await run_in_threadpool(import_products, firestore, list(chunk))
+      product_ids.extend(result["created"])
+      errors.extend(result["errors"])
+      chunk.clear()
+
+  async def take(raw: bytes) -> None:
+    nonlocal line_number
+    line_number += 1
+    try:
+      line = raw.decode("utf-8").strip()
+    except UnicodeDecodeError:
+      errors.append({"line": line_number, "error": "Line is not valid UTF-8"})
+      return
+    if line:
+      chunk.append((line_number, line))
+    if len(chunk) >= IMPORT_CHUNK_SIZE:
+      await flush()
+
+  async for data in request.stream():
+    buffer += data
+    *lines, buffer = buffer.split(b"\n")
+    for raw in lines:
+      await take(raw)
+  if buffer:
+    await take(buffer)
+  await flush()
+
+  return {
+    "created": len(product_ids),
+    "failed": len(errors),
+    "product_ids": product_ids,
+    "errors": errors,
+  }
+
+
+@router.post(":reprice", response_model=ProductRepriceResponse)
+def admin_reprice_products_route(
+  payload: ProductRepriceRequest,
+  authorization: str | None = Header(default=None),
+  firestore=Depends(get_firestore_client),
+):
+  access_token = extract_access_token(authorization)
+  require_admin_access(access_token, firestore, ADMIN_PRODUCT_WRITE_ROLES)
+  return reprice_products(
+    firestore,
+    query_text=payload.filter.q,
+    min_price=payload.filter.min_price,
+    max_price=payload.filter.max_price,
+    feature=payload.filter.feature,
+    spec_key=payload.filter.spec_key,
+    spec_value=payload.filter.spec_value,
+    percent=payload.rule.percent,
+    absolute=payload.rule.absolute,
+    round_to=payload.rule.round_to,
+    dry_run=payload.dry_run,
+  )
+
+
+@router.post(":publish", response_model=StaticCatalogPublishResponse)
+def admin_publish_static_catalog_route(
+  full: bool = Query(default=False),
+  authorization: str | None = Header(default=None),
+  firestore=Depends(get_firestore_client),
+):
+  access_token = extract_access_token(authorization)
+  require_admin_access(access_token, firestore, ADMIN_PRODUCT_WRITE_ROLES)
+  return publish_static_catalog(firestore, full=full)
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
 def admin_get_product_route(
   product_id: str,
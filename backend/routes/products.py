@@ -1,16 +1,41 @@
-from fastapi import APIRouter, Depends, Header, Query
+from fastapi import APIRouter, Depends, Header, Query, Response
 
 from controllers.product_controller import (
+  batch_get_products,
+  browse_products,
   create_product,
   delete_product,
   get_product,
-  list_products,
+  get_related_products,
+  list_product_changes,
+  render_product_list,
+  resolve_fieldset,
+  suggest_products,
   update_product,
 )
 from lib.admin_access import ADMIN_PRODUCT_WRITE_ROLES, require_admin_access
+from lib.catalog_version import (
+  apply_catalog_cache_headers,
+  catalog_etag,
+  catalog_version,
+  etag_matches,
+  not_modified_response,
+)
 from lib.firebase_auth import extract_access_token
 from lib.firestore_client import get_firestore_client
-from models.product import ProductCreateRequest, ProductResponse, ProductUpdateRequest
+from lib.pagination import apply_pagination_headers
+from models.product import (
+  ProductBatchGetRequest,
+  ProductBatchGetResponse,
+  ProductChangesResponse,
+  ProductCreateRequest,
+  ProductRelatedResponse,
+  ProductResponse,
+  ProductSearchResponse,
+  ProductSort,
+  ProductSuggestResponse,
+  ProductUpdateRequest,
+)
 
 router = APIRouter()
 
@@ -20,14 +45,66 @@ def list_products_route(
   firestore=Depends(get_firestore_client),
   limit: int = Query(50, ge=1, le=200),
   offset: int = Query(0, ge=0),
+  cursor: str | None = None,
+  q: str | None = None,
+  min_price: int | None = Query(default=None, ge=0),
+  max_price: int | None = Query(default=None, ge=0),
+  feature: str | None = None,
+  spec_key: str | None = None,
+  spec_value: str | None = None,
+  sort: ProductSort | None = None,
+  fields: str | None = None,
+  include: str | None = None,
+  if_none_match: str | None = Header(default=None),
+):
+  fieldset = resolve_fieldset(fields, include)
+  version = catalog_version.current(firestore)
+  etag = catalog_etag(version)
+  if etag_matches(if_none_match, etag):
+    return not_modified_response(etag)
+  # The body is already serialized JSON, so it bypasses response_model.
+  rendered = render_product_list(
+    firestore,
+    version,
+    limit,
+    offset,
+    query_text=q,
+    min_price=min_price,
+    max_price=max_price,
+    feature=feature,
+    spec_key=spec_key,
+    spec_value=spec_value,
+    cursor=cursor,
+    sort=sort,
+    fieldset=fieldset,
+  )
+  response = Response(content=rendered["body"], media_type="application/json")
+  apply_pagination_headers(response, rendered["next_cursor"], offset, cursor)
+  apply_catalog_cache_headers(response, etag)
+  return response
+
+
+@router.get("/search", response_model=ProductSearchResponse)
+def search_products_route(
+  response: Response,
+  firestore=Depends(get_firestore_client),
+  limit: int = Query(50, ge=1, le=200),
+  offset: int = Query(0, ge=0),
+  cursor: str | None = None,
   q: str | None = None,
   min_price: int | None = Query(default=None, ge=0),
   max_price: int | None = Query(default=None, ge=0),
   feature: str | None = None,
   spec_key: str | None = None,
   spec_value: str | None = None,
+  sort: ProductSort | None = None,
+  facet_limit: int = Query(20, ge=1, le=100),
+  if_none_match: str | None = Header(default=None),
 ):
-  return list_products(
+  etag = catalog_etag(catalog_version.current(firestore))
+  if etag_matches(if_none_match, etag):
+    return not_modified_response(etag)
+  result = browse_products(
     firestore,
     limit,
     offset,
@@ -37,12 +114,62 @@ def list_products_route(
     feature=feature,
     spec_key=spec_key,
     spec_value=spec_value,
+    cursor=cursor,
+    sort=sort,
+    facet_limit=facet_limit,
   )
+  apply_pagination_headers(response, result["next_cursor"], offset, cursor)
+  apply_catalog_cache_headers(response, etag)
+  return result
+
+
+@router.get("/suggest", response_model=ProductSuggestResponse)
+def suggest_products_route(
+  prefix: str = Query(min_length=1, max_length=100),
+  limit: int = Query(8, ge=1, le=20),
+  firestore=Depends(get_firestore_client),
+):
+  return suggest_products(firestore, prefix, limit)
+
+
+@router.get("/changes", response_model=ProductChangesResponse)
+def product_changes_route(
+  since: int = Query(ge=0),
+  limit: int = Query(500, ge=1, le=1000),
+  firestore=Depends(get_firestore_client),
+):
+  return list_product_changes(firestore, since, limit)
+
+
+@router.post(":batchGet", response_model=ProductBatchGetResponse)
+def batch_get_products_route(
+  payload: ProductBatchGetRequest,
+  firestore=Depends(get_firestore_client),
+):
+  return batch_get_products(firestore, payload.ids)
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product_route(product_id: str, firestore=Depends(get_firestore_client)):
-  return get_product(firestore, product_id)
+def get_product_route(
+  product_id: str,
+  response: Response,
+  firestore=Depends(get_firestore_client),
+  if_none_match: str | None = Header(default=None),
+):
+  etag = catalog_etag(catalog_version.current(firestore))
+  if etag_matches(if_none_match, etag):
+    return not_modified_response(etag)
+  product = get_product(firestore, product_id)
+  apply_catalog_cache_headers(response, etag)
+  return product
+
+
+@router.get("/{product_id}/related", response_model=ProductRelatedResponse)
+def get_related_products_route(
+  product_id: str,
+  firestore=Depends(get_firestore_client),
+):
+  return get_related_products(firestore, product_id)
 
 
 @router.post("", response_model=ProductResponse, status_code=201)
@@ -0,0 +1,103 @@
+import argparse
+
+from firebase_admin import firestore
+
+from controllers.product_controller import PRODUCT_CHILD_COLLECTIONS
+from lib.catalog_version import catalog_version
+from lib.firebase_admin import init_firebase
+
+MAX_BATCH_WRITES = 500
+
+
+def parse_args() -> argparse.Namespace:
+  parser = argparse.ArgumentParser(
+    description=(
+      "Embed product subcollections into their product documents and stamp "
+      "products that predate catalog versioning."
+    ),
+  )
+  parser.add_argument(
+    "--force",
+    action="store_true",
+    help="Rebuild embedded lists even when they are already present.",
+  )
+  parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=200,
+    help=f"Product updates per transaction (max {MAX_BATCH_WRITES - 1}).",
+  )
+  parser.add_argument(
+    "--dry-run",
+    action="store_true",
+    help="Report products that would be updated without writing.",
+  )
+  return parser.parse_args()
+
+
+def load_children(doc_ref, name: str) -> list[dict]:
+  children = []
+  for child in doc_ref.collection(name).order_by("sort_order").stream():
+    data = child.to_dict() or {}
+    data["id"] = child.id
+    children.append(data)
+  return children
+
+
+def commit_updates(db, updates: list[tuple]) -> None:
+  # Each chunk bumps catalog_meta/products in the same transaction and
+  # stamps its products with the new version, so version-keyed caches and
+  # ETags move on and the change feed reports the rewritten products.
+  def write(transaction, version: int) -> None:
+    for ref, update_data in updates:
+      transaction.update(ref, {**update_data, "catalog_version": version})
+
+  catalog_version.commit(db, write)
+
+
+def backfill(force: bool, batch_size: int, dry_run: bool) -> tuple[int, int]:
+  init_firebase()
+  db = firestore.client()
+  pending = []
+  scanned = 0
+  updated = 0
+
+  for doc in db.collection("products").stream():
+    scanned += 1
+    data = doc.to_dict() or {}
+    missing = [
+      name for name in PRODUCT_CHILD_COLLECTIONS
+      if force or not isinstance(data.get(name), list)
+    ]
+    unversioned = "catalog_version" not in data
+    if not missing and not unversioned:
+      continue
+
+    update_data = {name: load_children(doc.reference, name) for name in missing}
+    updated += 1
+    if dry_run:
+      print(f"{doc.id}: would embed {', '.join(missing) or 'nothing'}; stamp version: {unversioned}")
+      continue
+
+    pending.append((doc.reference, update_data))
+    if len(pending) >= batch_size:
+      commit_updates(db, pending)
+      pending = []
+
+  if pending:
+    commit_updates(db, pending)
+
+  return scanned, updated
+
+
+def main():
+  args = parse_args()
+  # One write per transaction is the catalog version document.
+  batch_size = max(1, min(args.batch_size, MAX_BATCH_WRITES - 1))
+  scanned, updated = backfill(args.force, batch_size, args.dry_run)
+  action = "would be updated" if args.dry_run else "updated"
+  print(f"Scanned {scanned} products, {updated} {action}.")
+
+
+if __name__ == "__main__":
+  main()
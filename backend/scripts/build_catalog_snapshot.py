@@ -0,0 +1,20 @@
+from firebase_admin import firestore
+
+from controllers.product_controller import ensure_catalog_snapshot
+from lib.catalog_snapshot import catalog_snapshot_path
+from lib.firebase_admin import init_firebase
+
+
+def main():
+  path = catalog_snapshot_path()
+  if not path:
+    print("PRODUCT_CATALOG_SNAPSHOT_PATH is not set.")
+    return
+
+  init_firebase()
+  ensure_catalog_snapshot(firestore.client(), force=True)
+  print(f"Catalog snapshot written to {path}.")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,19 @@
+from firebase_admin import firestore
+
+from controllers.product_controller import ensure_product_feeds
+from lib.firebase_admin import init_firebase
+from lib.product_feeds import product_feed_dir, product_feed_public_dir, product_site_url
+
+
+def main():
+  if not product_feed_dir() or not product_site_url():
+    print("PRODUCT_FEED_DIR and PRODUCT_SITE_URL must be set.")
+    return
+
+  init_firebase()
+  ensure_product_feeds(firestore.client(), force=True)
+  print(f"Product feeds written to {product_feed_public_dir()}.")
+
+
+if __name__ == "__main__":
+  main()
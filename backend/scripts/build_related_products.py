@@ -0,0 +1,38 @@
+import argparse
+
+from firebase_admin import firestore
+
+from controllers.product_controller import RELATED_PRODUCTS_LIMIT, build_related_products
+from lib.firebase_admin import init_firebase
+from lib.product_similarity import numpy_available
+
+
+def parse_args() -> argparse.Namespace:
+  parser = argparse.ArgumentParser(
+    description="Precompute related products from specs, features and price."
+  )
+  parser.add_argument(
+    "--limit",
+    type=int,
+    default=RELATED_PRODUCTS_LIMIT,
+    help="Related products stored per product.",
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  if not numpy_available():
+    print("numpy is required for this job (uv pip install numpy).")
+    return
+
+  init_firebase()
+  result = build_related_products(firestore.client(), max(1, args.limit))
+  print(
+    f"Related products built for {result['products']} products, "
+    f"{result['removed']} stale lists removed."
+  )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,39 @@
+import argparse
+
+from firebase_admin import firestore
+
+from controllers.product_controller import publish_static_catalog
+from lib.firebase_admin import init_firebase
+from lib.static_catalog import static_catalog_dir
+
+
+def parse_args() -> argparse.Namespace:
+  parser = argparse.ArgumentParser(
+    description="Publish the product catalog as static JSON shards.",
+  )
+  parser.add_argument(
+    "--full",
+    action="store_true",
+    help="Render every product instead of only those changed since the last publish.",
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  root = static_catalog_dir()
+  if not root:
+    print("PRODUCT_STATIC_CATALOG_DIR is not set.")
+    return
+
+  init_firebase()
+  result = publish_static_catalog(firestore.client(), full=args.full)
+  print(
+    f"Static catalog v{result['version']} published to {root}: "
+    f"{result['rendered']} products rendered, "
+    f"{result['written']} of {result['shards']} shards written, {result['removed']} removed."
+  )
+
+
+if __name__ == "__main__":
+  main()
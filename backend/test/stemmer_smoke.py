@@ -0,0 +1,73 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.product_search import ProductSearchIndex  # noqa: E402
+from lib.text_normalize import stem, stems  # noqa: E402
+
+STEMS = {
+  "membeli": "beli",
+  "mencuci": "cuci",
+  "pemanggang": "panggang",
+  "pemanggangan": "panggang",
+  "menggoreng": "goreng",
+  "menyaring": "saring",
+  "menulis": "tulis",
+  "melihat": "lihat",
+  "mendinginkan": "dingin",
+  "bukunya": "buku",
+  # Not prefixed forms: left whole.
+  "mesin": "mesin",
+  "mentega": "mentega",
+  "pedas": "pedas",
+  "kunci": "kunci",
+}
+
+# Ambiguous nasal prefixes index every possible root.
+ALTERNATIVES = {
+  "memasak": "masak",
+  "pengering": "kering",
+  "penanak": "nanak",
+}
+
+SEARCHES = {
+  "masak": ["1", "3"],
+  "memasak": ["1", "3"],
+  "panggang": ["2", "3"],
+  "kering": ["4"],
+}
+
+
+def main() -> None:
+  failures = []
+  for word, expected in STEMS.items():
+    if stem(word) != expected:
+      failures.append(f"stem({word!r}) = {stem(word)!r}, expected {expected!r}")
+  for word, expected in ALTERNATIVES.items():
+    if expected not in stems(word):
+      failures.append(f"stems({word!r}) = {stems(word)!r}, missing {expected!r}")
+
+  index = ProductSearchIndex()
+  index.rebuild(
+    [
+      {"id": "1", "title": "Alat memasak serbaguna"},
+      {"id": "2", "title": "Oven pemanggang roti"},
+      {"id": "3", "title": "Panggangan untuk masak"},
+      {"id": "4", "title": "Pengering rambut"},
+    ]
+  )
+  for query, expected in SEARCHES.items():
+    found = sorted(index.search(query) or {})
+    if found != expected:
+      failures.append(f"search({query!r}) = {found}, expected {expected}")
+
+  for failure in failures:
+    print(failure)
+  print(f"{len(STEMS) + len(ALTERNATIVES) + len(SEARCHES) - len(failures)} passed, {len(failures)} failed")
+  if failures:
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()